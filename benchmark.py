@@ -0,0 +1,135 @@
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+import sys
+import subprocess
+import tracemalloc
+from time import perf_counter
+import pygame as pg
+from state_engine import Game
+import prepare
+import menu, idle, dragging_piece, dragging_section
+
+# seconds from starting the interpreter to the first menu frame
+STARTUP_TARGET = 1.0
+# only imported once the user picks a file, animation or the camera
+DEFERRED = ("PIL", "pygame.camera")
+
+
+def make_states():
+    return {"MENU": menu.Menu(),
+            "IDLE": idle.Idle(),
+            "DRAGGING_PIECE": dragging_piece.DraggingPiece(),
+            "DRAGGING_SECTION": dragging_section.DraggingSection()}
+
+
+def make_game():
+    """A Game like main.py builds, sitting in IDLE on a fresh continent board."""
+    game = Game(prepare.SCREEN, make_states(), "MENU")
+    game.state.choose_map("Africa")
+    game.flip_state()
+    return game
+
+
+def transition_cost(game:Game, rounds=500, rebuild=False):
+    """
+    Flip IDLE -> DRAGGING_PIECE -> IDLE rounds times and return mean
+    microseconds and bytes allocated per transition. With rebuild the
+    UI manager is cleared before every return to IDLE, which is what
+    each transition used to cost.
+    """
+    piece = next(iter(game.state.puzzle.pieces.values()))
+    manager = game.state.persist["ui_manager"]
+
+    def flip(next_state:str):
+        game.state.next_state = next_state
+        game.flip_state()
+
+    elapsed = 0.0
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(rounds):
+        game.state.persist["grabbed_piece"] = piece
+        start = perf_counter()
+        flip("DRAGGING_PIECE")
+        elapsed += perf_counter() - start
+        if rebuild:
+            manager.clear_and_reset()
+        start = perf_counter()
+        flip("IDLE")
+        elapsed += perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return elapsed / (2 * rounds) * 1e6, allocated / (2 * rounds)
+
+
+def first_frame():
+    """What main.py does up to showing the menu, run in a fresh interpreter by the checks below."""
+    game = Game(prepare.SCREEN, make_states(), "MENU")
+    game.draw()
+    game.present()
+
+
+def startup_time(runs=3):
+    """Best wall time in seconds of a fresh interpreter getting to the first frame."""
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        subprocess.run([sys.executable, __file__, "--first-frame"], check=True)
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def import_report(top=10):
+    """
+    Imports up to the first frame from python -X importtime, summed per
+    top level package. Returns the top (package, milliseconds) pairs, the
+    total milliseconds and the DEFERRED modules that got imported anyway.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", __file__, "--first-frame"],
+                            check=True, capture_output=True, text=True)
+    packages:dict[str, int] = {}
+    loaded = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue
+        name = name.strip()
+        loaded.add(name)
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(own)
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)
+    deferred = [name for name in DEFERRED if name in loaded]
+    return [(name, micros / 1000) for name, micros in ranked[:top]], sum(packages.values()) / 1000, deferred
+
+
+def check_startup():
+    """Returns the failed startup checks, an empty list if startup is within budget."""
+    failures = []
+    seconds = startup_time()
+    print(f"{'first frame':>14}: {seconds * 1000:8.1f} ms (target {STARTUP_TARGET * 1000:.0f} ms)")
+    if seconds > STARTUP_TARGET:
+        failures.append(f"first frame after {seconds:.2f} s, target {STARTUP_TARGET:.2f} s")
+    ranked, total, deferred = import_report()
+    print(f"{'imports':>14}: {total:8.1f} ms")
+    for name, millis in ranked:
+        print(f"{name:>14}: {millis:8.1f} ms")
+    if deferred:
+        failures.append(f"imported before the first frame: {', '.join(deferred)}")
+    return failures
+
+
+if __name__ == "__main__":
+    if "--first-frame" in sys.argv:
+        first_frame()
+        sys.exit()
+    game = make_game()
+    for label, rebuild in (("persistent ui", False), ("rebuilt ui", True)):
+        micros, allocated = transition_cost(game, rebuild=rebuild)
+        print(f"{label:>14}: {micros:8.1f} us/transition {allocated:8.0f} bytes retained/transition")
+    failures = check_startup()
+    for failure in failures:
+        print("FAILED", failure)
+    sys.exit(1 if failures else 0)
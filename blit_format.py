@@ -0,0 +1,99 @@
+from time import perf_counter
+import pygame as pg
+
+KEY = pg.Color("black")
+# blits a piece image of a still board gets before it is replaced, boards
+# that slice every camera or animation frame blit each image about once
+STILL_DRAWS = 100
+
+
+def plain(surface:pg.Surface):
+    """Leave the surface as sliced: colorkeyed, in whatever format it was made."""
+    return surface
+
+
+def colorkey_rle(surface:pg.Surface):
+    converted = surface.convert()
+    converted.set_colorkey(KEY, pg.RLEACCEL)
+    return converted
+
+
+def alpha(surface:pg.Surface):
+    return surface.convert_alpha()
+
+
+def indexed(surface:pg.Surface):
+    """
+    8-bit pieces keep their palette to stay small, only the colorkey gets
+    RLE. On a copy, as surface may be a piece's upright image, which
+    rotating and caching read and would have to decode RLE for.
+    """
+    encoded = surface.copy()
+    encoded.set_colorkey(surface.get_colorkey(), pg.RLEACCEL)
+    return encoded
+
+
+FORMATS = {"plain": plain, "colorkey_rle": colorkey_rle, "alpha": alpha}
+
+
+class BlitFormat(object):
+    """
+    Last stage of the piece image pipeline. The first piece image finalized
+    for a display mode is used to time every candidate in FORMATS onto a
+    display-format canvas: once for converting a fresh image and its first
+    blit, where e.g. RLE encodes, and once per blit after that. Every piece
+    image is then turned into the format that is cheapest over the number
+    of blits it is expected to get. reset() after the display mode changes.
+    """
+    def __init__(self, rounds=200, samples=20):
+        self.rounds = rounds
+        self.samples = samples
+        # off when pieces are drawn as textures and their images never blitted
+        self.enabled = True
+        # format name by expected blits
+        self.names:dict[int, str] = {}
+        # seconds for the conversion and first blit, and for each blit after
+        self.timings:dict[str, tuple[float, float]] = {}
+
+    def reset(self):
+        self.names = {}
+        self.timings = {}
+
+    def choose(self, sample:pg.Surface):
+        canvas = pg.display.get_surface().copy()
+        for name, func in FORMATS.items():
+            copies = [sample.copy() for _ in range(self.samples)]
+            start = perf_counter()
+            for copy in copies:
+                surface = func(copy)
+                canvas.blit(surface, (0, 0))
+            once = (perf_counter() - start) / self.samples
+            start = perf_counter()
+            for _ in range(self.rounds):
+                canvas.blit(surface, (0, 0))
+            self.timings[name] = once, (perf_counter() - start) / self.rounds
+
+    def best(self, draws:int):
+        """The format name cheapest for an image blitted draws times."""
+        name = self.names.get(draws)
+        if name is None:
+            cost = lambda name: self.timings[name][0] + self.timings[name][1] * (draws - 1)
+            name = self.names[draws] = min(self.timings, key=cost)
+        return name
+
+    def finalize(self, surface:pg.Surface, draws=STILL_DRAWS):
+        """
+        Returns surface in the cheapest format for the display over draws
+        blits, or as is without a display.
+        """
+        if not self.enabled or pg.display.get_surface() is None:
+            return surface
+        if surface.get_bitsize() == 8:
+            # the RLE encode isn't worth it for an image blitted once
+            return surface if draws == 1 else indexed(surface)
+        if not self.timings:
+            self.choose(surface)
+        return FORMATS[self.best(draws)](surface)
+
+
+BLIT_FORMAT = BlitFormat()
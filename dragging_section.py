@@ -24,30 +24,30 @@ class DraggingSection(GameState):
             self.next_state = "MENU"
             self.done = True
         elif event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
-            for section in [x for x in self.sections if x is not self.grabbed]:
-                if self.grabbed.can_add_section(section):
-                    self.grabbed.add_section(section)
-                    self.sections.remove(section)
-                    self.grabbed.release()
-                    self.leave_state("IDLE")
-                    return
-            for piece in self.pieces:
-                if self.grabbed.can_add(piece):
-                    self.grabbed.add_piece(piece, self.puzzle.pieces)
-                    self.grabbed.release()
-                    self.leave_state("IDLE")
-                    return
+            self.puzzle.drop_section(self.grabbed)
             self.leave_state("IDLE")
         elif event.type == pg.MOUSEBUTTONDOWN and event.button == 3:
             self.grabbed.rotate()
         
+    def display_changed(self):
+        self.finalize_puzzle(self.puzzle)
+
+    def cleanup(self):
+        self.persist = {}
+        self.puzzle = self.sections = self.pieces = self.grabbed = None
+
+    def next_frame(self):
+        return 0
+
     def update(self, dt):
         if self.persist["mode"] == "camera":
             cam = self.persist["camera"]
             if cam.query_image():
-                self.puzzle.set_image(cam.get_image())
+                self.schedule_image(self.puzzle, cam.get_image(), self.grabbed.pieces)
         elif self.persist["mode"] == "animation":
-            self.persist["animation"].update(self.puzzle, dt)
+            frame = self.persist["animation"].update(dt)
+            if frame is not None:
+                self.schedule_image(self.puzzle, frame, self.grabbed.pieces)
         mouse_pos = pg.mouse.get_pos()
         self.grabbed.set_pos(mouse_pos)
 
@@ -3,8 +3,10 @@ from state_engine import GameState
 from puzzle import Puzzle
 import pygame_gui
 from pygame_gui import ui_manager
-from pygame import camera
 from tools import Animated
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from pygame import camera
 
 class Idle(GameState):
     def __init__(self):
@@ -14,17 +16,33 @@ class Idle(GameState):
         self.persist = persistent
         self.puzzle:Puzzle = self.persist["puzzle"]
         self.mode = self.persist["mode"]
+        self.puzzle.live = self.mode in ("camera", "animation")
         self.manager:ui_manager.UIManager = self.persist["ui_manager"]
-        self.manager.clear_and_reset()
-        if self.mode == "camera": self.camera:camera.Camera = self.persist["camera"]
+        if self.mode == "camera": self.camera:"camera.Camera" = self.persist["camera"]
         if self.mode == "animation": self.animation:Animated = self.persist["animation"]
         self.sections = self.puzzle.sections
         self.pieces = self.puzzle.pieces.values()
-        self.menuButton = pygame_gui.elements.UIButton(pg.Rect(50, 150, 250, 50), "Back to menu", manager=self.manager, visible=0)
-        self.congratulations = pygame_gui.elements.UILabel(pg.Rect(50, 50, 250, 50), "Congrats, you did it!", manager=self.manager, visible=0)
+        self.ensure_ui(self.manager)
         if len(self.sections) + len(self.pieces) == 1:
             self.menuButton.show()
             self.congratulations.show()
+        else:
+            self.menuButton.hide()
+            self.congratulations.hide()
+
+    def display_changed(self):
+        self.finalize_puzzle(self.puzzle)
+
+    def cleanup(self):
+        """Let go of the board so a replaced puzzle isn't kept alive from here."""
+        self.persist = {}
+        self.puzzle = self.sections = self.pieces = None
+        self.camera = self.animation = None
+
+    def setup_ui(self, manager):
+        self.menuButton = pygame_gui.elements.UIButton(pg.Rect(50, 150, 250, 50), "Back to menu", manager=manager, visible=0)
+        self.congratulations = pygame_gui.elements.UILabel(pg.Rect(50, 50, 250, 50), "Congrats, you did it!", manager=manager, visible=0)
+        return [self.menuButton, self.congratulations]
 
     def get_event(self, event):
         self.manager.process_events(event)
@@ -36,7 +54,7 @@ class Idle(GameState):
             self.done = True
         elif event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
             for piece in self.pieces:
-                if piece.collision.collidepoint(event.pos):
+                if piece.collide(event.pos):
                     piece.grabbed = True
                     self.persist["grabbed_piece"] = piece
                     self.next_state = "DRAGGING_PIECE"
@@ -49,15 +67,26 @@ class Idle(GameState):
                     self.done = True
                     return
 
+    def next_frame(self):
+        if self.mode == "camera":
+            return 0
+        elif self.mode == "animation":
+            return self.animation.time_to_next()
+        return None
+
     def update(self, dt):
         if self.mode == "camera":
             if self.camera.query_image():
-                self.puzzle.set_image(self.camera.get_image())
+                self.schedule_image(self.puzzle, self.camera.get_image())
         elif self.mode == "animation":
-            self.animation.update(self.puzzle, dt)
+            frame = self.animation.update(dt)
+            if frame is not None:
+                self.schedule_image(self.puzzle, frame)
         self.manager.update(dt/1000)
 
     def draw(self, surface:pg.Surface):
         surface.fill(pg.Color("grey10"))
         self.puzzle.draw(surface)
+
+    def draw_ui(self, surface:pg.Surface):
         self.manager.draw_ui(surface)
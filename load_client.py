@@ -0,0 +1,125 @@
+import asyncio
+from random import choice, randint, random
+from time import perf_counter
+import netcode
+
+
+class LoadClient(object):
+    """
+    A headless player for the shared-board server. It keeps its own copy
+    of the board from the server's deltas and keeps grabbing, moving,
+    rotating and dropping random pieces, pinging every so often to measure
+    round trip latency.
+    """
+    def __init__(self, actions_per_second=10, ping_interval=0.25):
+        self.board:dict[tuple[int,int], tuple] = {}
+        self.actions_per_second = actions_per_second
+        self.ping_interval = ping_interval
+        self.pings:dict[int, float] = {}
+        self.ping_seq = 0
+        self.latencies:list[float] = []
+        self.bytes_received = 0
+        self.frames = 0
+        self.held = None
+
+    async def receive(self, reader:asyncio.StreamReader):
+        while True:
+            length = netcode.LENGTH.unpack(await reader.readexactly(netcode.LENGTH.size))[0]
+            payload = await reader.readexactly(length)
+            self.bytes_received += netcode.LENGTH.size + length
+            self.frames += 1
+            tick, ping, pieces = netcode.decode_frame(payload)
+            sent = self.pings.pop(ping, None)
+            if sent is not None:
+                self.latencies.append(perf_counter() - sent)
+            for state in pieces:
+                self.board[(state[0], state[1])] = state
+
+    def next_action(self):
+        if self.held is None:
+            if not self.board:
+                return None
+            self.held = choice(list(self.board))
+            return netcode.encode_action(netcode.GRAB, self.held)
+        roll = random()
+        if roll < 0.1:
+            action = netcode.encode_action(netcode.DROP, self.held)
+            self.held = None
+            return action
+        if roll < 0.2:
+            return netcode.encode_action(netcode.ROTATE, self.held)
+        return netcode.encode_action(netcode.MOVE, self.held, (randint(100, 1400), randint(100, 800)))
+
+    async def play(self, writer:asyncio.StreamWriter, seconds:float):
+        end = perf_counter() + seconds
+        next_ping = perf_counter()
+        while perf_counter() < end:
+            now = perf_counter()
+            if now >= next_ping:
+                self.ping_seq = self.ping_seq % 0xFFFF + 1
+                self.pings[self.ping_seq] = now
+                writer.write(netcode.encode_action(netcode.PING, (self.ping_seq, 0)))
+                next_ping = now + self.ping_interval
+            action = self.next_action()
+            if action is not None:
+                writer.write(action)
+            await writer.drain()
+            await asyncio.sleep(1 / self.actions_per_second)
+
+    async def run(self, host:str, port:int, seconds:float):
+        reader, writer = await asyncio.open_connection(host, port)
+        receiver = asyncio.create_task(self.receive(reader))
+        try:
+            await self.play(writer, seconds)
+        finally:
+            receiver.cancel()
+            writer.close()
+
+
+def percentile(values:list[float], fraction:float):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def load_test(host="127.0.0.1", port=5566, clients=50, seconds=5.0, spawn=False, **server_kwargs):
+    """
+    Connect clients LoadClients to a server and let them play for seconds.
+    With spawn a BoardServer is started in this process first. Returns a
+    dict with bandwidth per client and round trip latency percentiles.
+    """
+    server_task = None
+    if spawn:
+        from server import BoardServer, make_puzzle
+        board = BoardServer(make_puzzle(**server_kwargs))
+        server_task = asyncio.create_task(board.run(host, port))
+        await asyncio.sleep(0.2)
+    players = [LoadClient() for _ in range(clients)]
+    try:
+        await asyncio.gather(*(player.run(host, port, seconds) for player in players))
+    finally:
+        if server_task is not None:
+            server_task.cancel()
+    latencies = [latency for player in players for latency in player.latencies]
+    received = sum(player.bytes_received for player in players)
+    return {"clients": clients,
+            "seconds": seconds,
+            "kB/s per client": received / 1024 / seconds / clients,
+            "frames per client": sum(player.frames for player in players) / clients,
+            "latency p50 ms": percentile(latencies, 0.5) * 1000,
+            "latency p99 ms": percentile(latencies, 0.99) * 1000}
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Load generator for the shared-board server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5566)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--spawn", action="store_true", help="start a server in this process")
+    args = parser.parse_args()
+    result = asyncio.run(load_test(args.host, args.port, args.clients, args.seconds, args.spawn))
+    for key, value in result.items():
+        print(f"{key:>18}: {value:.2f}" if isinstance(value, float) else f"{key:>18}: {value}")
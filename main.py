@@ -1,4 +1,5 @@
 import sys
+import signal
 import pygame as pg
 
 from state_engine import Game, GameState
@@ -10,6 +11,21 @@ states = {"MENU": menu.Menu(),
           "DRAGGING_PIECE": dragging_piece.DraggingPiece(),
           "DRAGGING_SECTION": dragging_section.DraggingSection()}
 game = Game(prepare.SCREEN, states, "MENU")
+for arg in sys.argv[1:]:
+    if arg.startswith("--memory"):
+        # --memory or --memory=<budget in MB>
+        from memory import MemoryTracker, MB
+        budget = arg.partition("=")[2]
+        game.memory = MemoryTracker(prepare.GFX, prepare.CONTINENTS,
+                                    int(budget) * MB if budget else None, trace=True)
+    elif arg.startswith("--render-scale="):
+        game.set_render_scale(float(arg.partition("=")[2]))
+# a kiosk restart ends the loop like closing the window, so the board is saved
+signal.signal(signal.SIGTERM, lambda signum, frame: setattr(game, "done", True))
 game.run()
 pg.quit()
+if game.memory is not None:
+    print(game.memory.report())
+    # a kiosk's launcher can tell from the exit status that the budget was exceeded
+    sys.exit(1 if game.memory.over_budget() else 0)
 sys.exit()
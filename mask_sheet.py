@@ -0,0 +1,96 @@
+"""
+Packs the piece cover masks into a single sheet image with a JSON index,
+so startup reads and decodes one file instead of one per cover.
+
+Build (or rebuild after changing the covers) with
+
+    python mask_sheet.py [--columns 8] [--rows 8] [--prefix piece]
+
+Covers named f"{prefix}{column}-{row}" are laid out in a grid at the top
+of the sheet and any other images given with --extra are stacked below
+it. The index records the grid and the rect of every extra image, so
+sheets for other grid sizes load the same way.
+"""
+import os
+import json
+import argparse
+import pygame as pg
+from PIL import Image
+
+SOURCE = os.path.join("resources", "graphics")
+SHEET = os.path.join("resources", "sheets", "masks")
+
+
+def pack(directory:str, columns:int, rows:int, prefix="piece", extras=("puzzle",)):
+    """Returns the sheet Surface and its index for the covers in directory."""
+    covers = [[pg.image.load(os.path.join(directory, f"{prefix}{column}-{row}.png"))
+               for column in range(columns)] for row in range(rows)]
+    size = covers[0][0].get_size()
+    others = {name: pg.image.load(os.path.join(directory, f"{name}.png")) for name in extras}
+    width = max([size[0] * columns] + [image.get_width() for image in others.values()])
+    height = size[1] * rows + sum(image.get_height() for image in others.values())
+    sheet = pg.Surface((width, height), pg.SRCALPHA)
+    sheet.fill((0, 0, 0, 0))
+    for row, images in enumerate(covers):
+        for column, image in enumerate(images):
+            sheet.blit(image, (column * size[0], row * size[1]))
+    index = {"grids": [{"prefix": prefix, "start": [0, 0], "size": list(size),
+                        "columns": columns, "rows": rows}],
+             "images": {}}
+    y = size[1] * rows
+    for name, image in others.items():
+        sheet.blit(image, (0, y))
+        index["images"][name] = [0, y, *image.get_size()]
+        y += image.get_height()
+    return sheet, index
+
+
+def save_sheet(sheet:pg.Surface, path:str):
+    """
+    Masks only use a handful of colors, so the sheet is written as a
+    palettized PNG with a transparency table when it fits in 256 colors:
+    lossless, and about half the decode time of RGBA.
+    """
+    image = Image.frombytes("RGBA", sheet.get_size(), pg.image.tobytes(sheet, "RGBA"))
+    colors = image.getcolors(256)
+    if colors is None:
+        image.save(path)
+        return
+    palette = [color for _, color in colors]
+    lookup = {color: number for number, color in enumerate(palette)}
+    indexed = Image.new("P", image.size)
+    indexed.putdata([lookup[pixel] for pixel in image.getdata()])
+    indexed.putpalette([channel for color in palette for channel in color[:3]])
+    indexed.save(path, transparency=bytes(color[3] for color in palette), optimize=True)
+
+
+def build(directory=SOURCE, path=SHEET, columns=8, rows=8, prefix="piece", extras=("puzzle",)):
+    sheet, index = pack(directory, columns, rows, prefix, extras)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    save_sheet(sheet, path + ".png")
+    with open(path + ".json", "w") as f:
+        json.dump(index, f, indent=1)
+    return index
+
+
+def names(index:dict):
+    """All image names a sheet index provides."""
+    found = list(index["images"])
+    for grid in index["grids"]:
+        found.extend(f"{grid['prefix']}{column}-{row}"
+                     for row in range(grid["rows"]) for column in range(grid["columns"]))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack piece cover masks into one sheet.")
+    parser.add_argument("--columns", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=8)
+    parser.add_argument("--prefix", default="piece")
+    parser.add_argument("--extra", nargs="*", default=["puzzle"])
+    parser.add_argument("--source", default=SOURCE)
+    parser.add_argument("--output", default=SHEET)
+    args = parser.parse_args()
+    pg.init()
+    index = build(args.source, args.output, args.columns, args.rows, args.prefix, args.extra)
+    print(f"packed {len(names(index))} images into {args.output}.png")
@@ -0,0 +1,144 @@
+import gc
+import sys
+import weakref
+import tracemalloc
+import pygame as pg
+
+MB = 1024 * 1024
+
+
+def surface_bytes(surface:pg.Surface):
+    """Pixel bytes owned by surface, 0 for subsurfaces which share their parent's."""
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_pitch() * surface.get_height()
+
+
+def unique_bytes(surfaces):
+    seen = set()
+    total = 0
+    for surface in surfaces:
+        if surface is not None and id(surface) not in seen:
+            seen.add(id(surface))
+            total += surface_bytes(surface)
+    return total
+
+
+def puzzle_surfaces(puzzle):
+    pieces = list(puzzle.pieces.values())
+    for section in puzzle.sections:
+        pieces.extend(section.pieces)
+    for piece in pieces:
+        yield getattr(piece, "image", None)
+        yield getattr(piece, "upright_image", None)
+
+
+def puzzle_bytes(puzzle):
+    """Bytes of piece images held by a Puzzle, shared surfaces counted once."""
+    return unique_bytes(puzzle_surfaces(puzzle))
+
+
+def animation_bytes(animation):
+    """
+    Returns (resident, mapped) bytes of an Animated's frames. Frames in a
+    FrameStore are mapped and only resident as far as the page cache keeps them.
+    """
+    if isinstance(animation.frames, list):
+        return unique_bytes(animation.frames), 0
+    return 0, animation.frames.nbytes
+
+
+def gfx_bytes(gfx:dict[str, pg.Surface], continents=()):
+    """Bytes of prepare.GFX by category: piece covers, continents and other images.
+    A sheet is counted under the first image taken from it."""
+    categories = {"covers": 0, "continents": 0, "other": 0}
+    sheets = set()
+    for name, surface in gfx.items():
+        if name.startswith("piece"):
+            category = "covers"
+        elif name.replace("-", " ") in continents:
+            category = "continents"
+        else:
+            category = "other"
+        parent = surface.get_parent()
+        if parent is not None and id(parent) not in sheets:
+            # images loaded from a sheet share it; count it once
+            sheets.add(id(parent))
+            surface = parent
+        categories[category] += surface_bytes(surface)
+    return categories
+
+
+class MemoryTracker(object):
+    """
+    Samples surface memory whenever the Game switches state, keeping the
+    current and peak totals. Puzzles and animations are only held weakly,
+    so any that stay alive after being replaced show up as leaks.
+    With trace the Python heap is followed through tracemalloc as well;
+    pixel data lives in SDL and is not seen by tracemalloc.
+    """
+    def __init__(self, gfx:dict[str, pg.Surface]|None=None, continents=(), budget:int|None=None, trace=False):
+        self.gfx = gfx_bytes(gfx or {}, continents)
+        self.budget = budget
+        self.trace = trace
+        self.puzzles = weakref.WeakSet()
+        self.animations = weakref.WeakSet()
+        self.samples:list[dict] = []
+        self.peak = 0
+        self.current = None
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def sample(self, label:str, persist:dict):
+        """
+        Record memory use after switching to the state named label. The
+        first sample over budget prints a warning to stderr.
+        """
+        puzzle = persist.get("puzzle")
+        animation = persist.get("animation")
+        if puzzle is not None:
+            self.puzzles.add(puzzle)
+        if animation is not None:
+            self.animations.add(animation)
+        if self.current is None or self.current() is not puzzle:
+            gc.collect()
+            self.current = None if puzzle is None else weakref.ref(puzzle)
+        resident, mapped = (0, 0) if animation is None else animation_bytes(animation)
+        leaked_puzzles = [p for p in self.puzzles if p is not puzzle]
+        leaked_animations = [a for a in self.animations if a is not animation]
+        sample = {"state": label,
+                  "puzzle": 0 if puzzle is None else puzzle_bytes(puzzle),
+                  "animation": resident,
+                  "mapped": mapped,
+                  "dropped frames": 0 if animation is None else animation.dropped,
+                  "gfx": sum(self.gfx.values()),
+                  "leaked puzzles": len(leaked_puzzles),
+                  "leaked animations": len(leaked_animations),
+                  "leaked": sum(map(puzzle_bytes, leaked_puzzles))
+                            + sum(animation_bytes(a)[0] for a in leaked_animations)}
+        sample["total"] = sample["puzzle"] + sample["animation"] + sample["gfx"] + sample["leaked"]
+        if self.trace:
+            sample["heap"], sample["heap peak"] = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, sample["total"])
+        sample["over budget"] = self.budget is not None and sample["total"] > self.budget
+        if sample["over budget"] and not any(s["over budget"] for s in self.samples):
+            print(f"memory: {sample['total'] / MB:.1f} MB in {label} is over the budget "
+                  f"of {self.budget / MB:.1f} MB", file=sys.stderr)
+        self.samples.append(sample)
+        return sample
+
+    def over_budget(self):
+        return self.budget is not None and self.peak > self.budget
+
+    def report(self):
+        current = self.samples[-1] if self.samples else {}
+        return {"current": current.get("total", 0),
+                "peak": self.peak,
+                "budget": self.budget,
+                "over budget": self.over_budget(),
+                "gfx": self.gfx,
+                "samples": len(self.samples),
+                "leaked": current.get("leaked", 0),
+                "leaked puzzles": current.get("leaked puzzles", 0),
+                "leaked animations": current.get("leaked animations", 0),
+                "dropped frames": current.get("dropped frames", 0)}
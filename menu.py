@@ -1,12 +1,16 @@
+import os
+import struct
 import pygame as pg
 import pygame_gui
 import prepare
+import savegame
 from state_engine import GameState
 from puzzle import Puzzle, HexPuzzle
-from pygame import camera
-from pygame_gui.windows import ui_file_dialog
-from PIL import Image
-from tools import Animated
+from tools import Animated, load_scaled
+# camera, PIL and the file dialog are only imported once the user picks them
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from pygame import camera
 
 class Menu(GameState):
     def __init__(self):
@@ -17,19 +21,26 @@ class Menu(GameState):
         self.persist["shape"] = "puzzle"
         self.make_buttons()
         self.clicked_camera = False
-        self.camera:camera.Camera
+        self.camera:"camera.Camera"
 
     def startup(self, persistent):
         self.persist = {}
         self.persist["ui_manager"] = self.manager
         self.persist["shape"] = "puzzle"
         self.manager.clear_and_reset()
+        if "puzzle" in persistent:
+            # don't keep slicing frames into a board that is going away
+            self.scheduler.cancel(persistent["puzzle"])
+        savegame.save_board(prepare.SAVE_PATH, persistent)
         self.make_buttons()
         if persistent["mode"] == "camera":
             cam:camera.Camera = persistent["camera"]
             cam.stop()
             self.clicked_camera = False
 
+    def cleanup(self):
+        self.manager.clear_and_reset()
+
     def make_buttons(self):
         self.buttons:list[pygame_gui.elements.UIButton] = []
         continents = sorted(prepare.CONTINENTS)
@@ -44,6 +55,9 @@ class Menu(GameState):
         top = self.screen_rect.centery - (h + vert_space * 5) // 2
         self.camera_button = pygame_gui.elements.UIButton(relative_rect=pg.Rect((100, top, w, h)), text='Camera', manager=self.manager)
         self.file_button = pygame_gui.elements.UIButton(relative_rect=pg.Rect((100, top + 100, w, h)), text='Choose Image', manager=self.manager)
+        self.resume_button = None
+        if os.path.exists(prepare.SAVE_PATH):
+            self.resume_button = pygame_gui.elements.UIButton(relative_rect=pg.Rect((100, top + 200, w, h)), text='Resume', manager=self.manager)
         btn_rect.topright = (-50, 100)
         self.shape_dropdown = pygame_gui.elements.UIDropDownMenu(["puzzle", "hexagon"], "puzzle", btn_rect, self.manager, anchors={"right":"right", "top":"top"})
         btn_rect.topright = (-50, 200)
@@ -56,14 +70,16 @@ class Menu(GameState):
         name = continent.replace(" ", "-")
         img:pg.Surface = prepare.GFX[name]
         self.persist["mode"] = "continent"
+        self.persist["source"] = continent
         if self.persist["shape"] == "puzzle":
-            self.persist["puzzle"] = Puzzle(img)
+            self.persist["puzzle"] = Puzzle(img, prepare.PUZZLE_CACHE)
         elif self.persist["shape"] == "hexagon":
-            self.persist["puzzle"] = HexPuzzle(img, self.hexes)
+            self.persist["puzzle"] = HexPuzzle(img, self.hexes, prepare.PUZZLE_CACHE)
         self.next_state = "IDLE"
         self.done = True
 
     def choose_camera(self):
+        from pygame import camera
         camera.init()
         cameras = camera.list_cameras()
         self.camera = camera.Camera(cameras[0])
@@ -76,16 +92,18 @@ class Menu(GameState):
         self.clicked_camera = True
     
     def choose_file(self, filePath:str):
-        img = pg.image.load(filePath)
+        img = load_scaled(filePath)
         self.persist["mode"] = "file"
+        self.persist["source"] = filePath
         if self.persist["shape"] == "puzzle":
-            self.persist["puzzle"] = Puzzle(img)
+            self.persist["puzzle"] = Puzzle(img, prepare.PUZZLE_CACHE)
         elif self.persist["shape"] == "hexagon":
-            self.persist["puzzle"] = HexPuzzle(img, self.hexes)
+            self.persist["puzzle"] = HexPuzzle(img, self.hexes, prepare.PUZZLE_CACHE)
         self.next_state = "IDLE"
         self.done = True
 
     def choose_animated_file(self, filePath:str):
+        from PIL import Image
         with Image.open(filePath) as img:
             if img.n_frames==None or img.n_frames == 1:
                 self.choose_file(filePath)
@@ -93,6 +111,7 @@ class Menu(GameState):
             animation = Animated(img)
             self.persist["animation"] = animation
         self.persist["mode"] = "animation"
+        self.persist["source"] = filePath
         if self.persist["shape"] == "puzzle":
             self.persist["puzzle"] = Puzzle(animation.first_frame())
         elif self.persist["shape"] == "hexagon":
@@ -100,15 +119,54 @@ class Menu(GameState):
         self.next_state = "IDLE"
         self.done = True
 
+    def resume(self):
+        """
+        Rebuild the saved board from its source without scrambling it
+        again. A save that can't be read, or whose source image is gone,
+        is deleted and the Resume button hidden.
+        """
+        try:
+            saved = savegame.read(prepare.SAVE_PATH)
+            mode, source = saved["mode"], saved["source"]
+            if mode == "continent":
+                img = prepare.GFX[source.replace(" ", "-")]
+            elif mode == "file":
+                img = load_scaled(source)
+            else:
+                from PIL import Image
+                with Image.open(source) as image:
+                    animation = Animated(image)
+                img = animation.first_frame()
+            if saved["shape"] == "puzzle":
+                puzzle = Puzzle(img, prepare.PUZZLE_CACHE, spread=False)
+            else:
+                puzzle = HexPuzzle(img, saved["hexes"], prepare.PUZZLE_CACHE, spread=False)
+            savegame.restore(puzzle, saved["pieces"])
+        except (OSError, ValueError, KeyError, IndexError, struct.error):
+            savegame.discard(prepare.SAVE_PATH)
+            self.resume_button.hide()
+            return
+        if mode == "animation":
+            self.persist["animation"] = animation
+        self.persist["mode"] = mode
+        self.persist["source"] = source
+        self.persist["shape"] = saved["shape"]
+        self.persist["puzzle"] = puzzle
+        self.next_state = "IDLE"
+        self.done = True
+
     def get_event(self, event):
         if self.manager.process_events(event): return
         if event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
             self.quit = True
         elif event.type == pygame_gui.UI_BUTTON_PRESSED:
             if event.ui_element == self.file_button:
+                from pygame_gui.windows import ui_file_dialog
                 self.uifd = ui_file_dialog.UIFileDialog(prepare.SCREEN_RECT, self.manager, "Choose an image", {"png","jpg","gif","webp"}, allow_existing_files_only=True)
             elif event.ui_element == self.camera_button:
                 self.choose_camera()
+            elif event.ui_element == self.resume_button:
+                self.resume()
             else:
                 for button in self.buttons:
                     if button.check_pressed():
@@ -130,6 +188,14 @@ class Menu(GameState):
             self.hexes = event.value
             self.hex_slide_label.set_text(str(event.value))
 
+    def next_frame(self):
+        return 0 if self.clicked_camera else None
+
+    def ui_state(self):
+        """Changes whenever a visible UI element does, e.g. on hover or a blinking text cursor."""
+        return [(id(element.image), tuple(element.rect)) for element in self.manager.ui_group.sprites()
+                if element.visible]
+
     def update(self, dt):
         if self.clicked_camera:
             if self.camera.query_image():
@@ -140,8 +206,13 @@ class Menu(GameState):
                     self.persist["puzzle"] = HexPuzzle(img, self.hexes)
                 self.next_state = "IDLE"
                 self.done = True
+        before = self.ui_state()
         self.manager.update(dt/1000)
-        
+        if self.ui_state() != before:
+            self.redraw = True
+
     def draw(self, surface):
         surface.fill(pg.Color("black"))
+
+    def draw_ui(self, surface):
         self.manager.draw_ui(surface)
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Wire format shared by the shared-board server and its clients.
+
+Client -> server: fixed size ACTION records (action, column, row, x, y).
+Server -> client: length prefixed frames, a FRAME_HEADER followed by one
+PIECE record for every piece that changed since the previous tick.
+Everything is little endian. This module does not import pygame, so light
+clients can use it on their own.
+"""
+import struct
+
+GRAB = 1
+MOVE = 2
+ROTATE = 3
+DROP = 4
+PING = 5
+
+NO_SECTION = 0xFFFF
+
+ACTION = struct.Struct("<BHHhh")
+LENGTH = struct.Struct("<I")
+# tick, echoed ping sequence, number of PIECE records
+FRAME_HEADER = struct.Struct("<IHH")
+# column, row, centerx, centery, orientation, section id
+PIECE = struct.Struct("<HHhhBH")
+
+
+def encode_action(action:int, index:tuple[int,int]=(0, 0), pos:tuple[int,int]=(0, 0)):
+    return ACTION.pack(action, index[0], index[1], pos[0], pos[1])
+
+
+def decode_action(data:bytes, offset=0):
+    action, column, row, x, y = ACTION.unpack_from(data, offset)
+    return action, (column, row), (x, y)
+
+
+def encode_pieces(states:list[tuple[int,int,int,int,int,int]]):
+    """Pack the shared body of a frame, one PIECE record per state."""
+    body = bytearray(PIECE.size * len(states))
+    for i, state in enumerate(states):
+        PIECE.pack_into(body, i * PIECE.size, *state)
+    return bytes(body)
+
+
+def encode_frame(tick:int, ping:int, count:int, body:bytes):
+    header = FRAME_HEADER.pack(tick & 0xFFFFFFFF, ping, count)
+    return LENGTH.pack(len(header) + len(body)) + header + body
+
+
+def decode_frame(payload:bytes):
+    """Returns (tick, ping, [PIECE tuples]) for a payload without its length prefix."""
+    tick, ping, count = FRAME_HEADER.unpack_from(payload, 0)
+    pieces = list(PIECE.iter_unpack(payload[FRAME_HEADER.size:FRAME_HEADER.size + count * PIECE.size]))
+    return tick, ping, pieces
@@ -1,6 +1,10 @@
 import os
+import sys
 import pygame as pg
 import tools
+import render
+from blit_format import BLIT_FORMAT
+from puzzle_cache import PuzzleCache
 
 
 SCREEN_SIZE = (1500, 900)
@@ -11,10 +15,24 @@ pg.mixer.pre_init(44100, -16, 1, 512)
 pg.init()
 os.environ['SDL_VIDEO_CENTERED'] = "TRUE"
 pg.display.set_caption(ORIGINAL_CAPTION)
-SCREEN = pg.display.set_mode(SCREEN_SIZE)
+# --renderer=<one of render.BACKENDS>
+RENDERER = next((arg.partition("=")[2] for arg in sys.argv[1:] if arg.startswith("--renderer=")), "surface")
+if RENDERER not in render.BACKENDS:
+    raise SystemExit(f"--renderer must be one of {', '.join(render.BACKENDS)}")
+if RENDERER == "surface":
+    SCREEN = pg.display.set_mode(SCREEN_SIZE)
+else:
+    # the hidden display surface still gives convert() its pixel format
+    pg.display.set_mode(SCREEN_SIZE, pg.HIDDEN)
+    SCREEN = render.TextureScreen(SCREEN_SIZE, ORIGINAL_CAPTION, RENDERER)
+    BLIT_FORMAT.enabled = False
 SCREEN_RECT = SCREEN.get_rect()
 CONTINENTS = ("Africa", "North America", "South America", "Europe", "Asia", "Oceania")
 
-GFX = tools.load_all_gfx(os.path.join("resources", "graphics"))
+MASKS = tools.load_sheet(os.path.join("resources", "sheets", "masks"))
+GFX = tools.load_all_gfx(os.path.join("resources", "graphics"), skip=MASKS)
+GFX.update(MASKS)
 SFX = tools.load_all_sfx(os.path.join("resources", "sounds"))
-MUSIC = tools.load_all_music(os.path.join("resources", "music"))
\ No newline at end of file
+MUSIC = tools.load_all_music(os.path.join("resources", "music"))
+PUZZLE_CACHE = PuzzleCache(os.path.join("resources", "cache"))
+SAVE_PATH = os.path.join("resources", "save", "puzzle.pzs")
\ No newline at end of file
@@ -1,204 +1,285 @@
-from random import randint, shuffle
 import pygame as pg
 import prepare
-from puzzle_piece import PuzzlePiece, PuzzleSection, HexPuzzlePiece, HexPuzzleSection
-from math import sqrt, ceil, sin, cos, pi
+from puzzle_model import BoardModel, HexBoardModel, BOARD_SIZE
+from puzzle_piece import PieceShape, PuzzlePiece, PuzzleSection, HexPuzzlePiece, HexPuzzleSection
+from puzzle_cache import PuzzleCache
+from blit_format import STILL_DRAWS
+from math import sin, cos, pi
 
-class Puzzle(object):
-    def __init__(self, puzzle_image:pg.Surface):
-        self.sections:list[PuzzleSection] = []
+# palette index an 8-bit puzzle image leaves free for the black colorkey
+KEY_INDEX = 255
+
+class Puzzle(BoardModel):
+    """
+    Rendering side of a board: slices the image into the pieces laid out
+    by the model and draws them. All joining happens in BoardModel.
+    """
+    piece_type = PuzzlePiece
+    section_type = PuzzleSection
+    # image pixels per board pixel for new piece images, set by Game.set_render_scale
+    render_scale = 1.0
+    # counts the images given to set_image, see image_order
+    image_serial = 0
+    # camera and animation boards slice every frame, each piece image is blitted about once
+    live = False
+
+    def __init__(self, puzzle_image:pg.Surface, cache:PuzzleCache|None=None, spread=True):
+        BoardModel.__init__(self)
+        self.cache = cache
         self.make_pieces(puzzle_image)
-        self.spread_pieces()
+        if spread:
+            self.spread_pieces(prepare.SCREEN_SIZE)
 
     def draw(self, surface:pg.Surface):
+        """Draw onto surface, the screen or a canvas at render_scale times its resolution."""
         for section in reversed(self.sections):
-            section.draw(surface)
+            section.draw(surface, self.render_scale)
         for piece in reversed(self.pieces.values()):
-            piece.draw(surface)
+            piece.draw(surface, self.render_scale)
     
+    @staticmethod
+    def indexed(puzzle_image:pg.Surface):
+        """Whether puzzle_image can be sliced in 8-bit: it is, and leaves KEY_INDEX unused."""
+        return (puzzle_image.get_bitsize() == 8
+                and bytes([KEY_INDEX]) not in pg.image.tobytes(puzzle_image, "P"))
+
     def set_image(self, puzzle_image:pg.Surface):
+        for _ in self.image_steps(puzzle_image):
+            pass
+
+    def image_steps(self, puzzle_image:pg.Surface, first=()):
+        """
+        set_image as a generator yielding after every piece, for
+        Game's scheduler. The pieces in first are done before any others.
+        """
+        img = self.prepare_image(puzzle_image)
+        scale = self.image_scale
+        self.image_serial += 1
+        serial = self.image_serial
+        yield
+        for piece in self.image_order(first):
+            piece.set_image(self.make_piece_img(img, piece), scale, 1 if self.live else STILL_DRAWS)
+            piece.image_serial = serial
+            yield
+
+    def image_order(self, first=()):
+        """
+        first, then the pieces on screen, then the rest. Within those the
+        pieces sliced from the oldest image go first, so none are starved
+        when images come faster than they are sliced, and otherwise from
+        the top of the pile down.
+        """
+        first = list(first)
+        chosen = set(first)
+        pieces = [piece for piece in self.pieces.values() if piece not in chosen]
+        for section in self.sections:
+            pieces.extend(piece for piece in section.pieces if piece not in chosen)
+        screen = prepare.SCREEN_RECT
+        age = lambda piece: piece.image_serial
+        visible = sorted((piece for piece in pieces if screen.colliderect(piece.rect)), key=age)
+        hidden = sorted((piece for piece in pieces if not screen.colliderect(piece.rect)), key=age)
+        return first + visible + hidden
+
+    # changes to how pieces are sliced need puzzle_cache.SLICE_VERSION bumped
+    def prepare_image(self, puzzle_image:pg.Surface):
+        """Scale puzzle_image to the board at the render scale, with black kept free for the colorkey."""
         img:pg.Surface = puzzle_image
-        img = img.convert(24)
-        scalar = 800 / max(img.get_size())
-        img = pg.transform.smoothscale_by(img, scalar)
-        img.set_alpha(None)
-        pg.transform.threshold(img, img, (0,0,0), set_color=pg.Color(1,1,1), inverse_set=True)
+        self.source_image = puzzle_image
+        self.image_scale = self.render_scale
+        size = self.scaled_size(img.get_size(), self.image_scale)
+        if self.indexed(img):
+            # nearest neighbour scaling keeps the indices, black moves to KEY_INDEX
+            img = pg.transform.scale(img, size)
+            palette = [pg.Color(1,1,1) if color[:3] == (0,0,0) else color for color in img.get_palette()]
+            palette[KEY_INDEX] = pg.Color("black")
+            img.set_palette(palette)
+        else:
+            img = img.convert(24)
+            img = pg.transform.smoothscale(img, size)
+            img.set_alpha(None)
+            pg.transform.threshold(img, img, (0,0,0), set_color=pg.Color(1,1,1), inverse_set=True)
+        return img
+
+    @staticmethod
+    def scaled_size(image_size:tuple[int, int], scale:float):
+        """Size prepare_image gives an image of image_size at scale, also used for the shapes."""
+        scalar = BOARD_SIZE * scale / max(image_size)
+        return round(image_size[0] * scalar), round(image_size[1] * scalar)
+
+    def finalize_images(self):
+        """
+        Redo the display dependent stages of every piece image after a mode
+        change. Pieces sliced at another render scale need slicing again,
+        see GameState.finalize_puzzle.
+        """
         for piece in self.pieces.values():
-            surf = self.make_piece_img(img, piece)
-            piece.set_image(surf)
+            piece.update_image()
         for section in self.sections:
             for piece in section.pieces:
-                surf = self.make_piece_img(img, piece)
-                piece.set_image(surf)
+                piece.update_image()
 
     def make_pieces(self, puzzle_image:pg.Surface):
-        self.pieces:dict[tuple[int, int], PuzzlePiece] = {}
-        img_rect:pg.Rect = puzzle_image.get_rect()
-        scalar = 800 / max(img_rect.size)
-        pieceW = int(img_rect.w / 8 * scalar)
-        pieceH = int(img_rect.h / 8 * scalar)
-        for column in range(0, 8):
-            for row in range(0, 8):
-                self.pieces[(column, row)] = PuzzlePiece((column, row), (pieceW, pieceH))
-        self.set_image(puzzle_image)
+        self.layout(puzzle_image.get_size())
+        self.make_shapes(puzzle_image.get_size())
+        self.source_image = puzzle_image
+        if not self.load_cached(puzzle_image):
+            self.set_image(puzzle_image)
+            self.link_neighbors()
+            self.store_cached()
+
+    def make_shapes(self, image_size:tuple[int, int]):
+        """Give every piece the PieceShape of its cover, once per board."""
+        board = pg.Rect((0, 0), self.scaled_size(image_size, 1.0))
         for piece in self.pieces.values():
-            piece.get_neighbors(self.pieces)
+            piece.shape = PieceShape(self.make_mask(piece, board), piece.turn)
+
+    def make_mask(self, piece:PuzzlePiece, board:pg.Rect):
+        """
+        The upright mask of piece as sliced at scale 1 from an image of
+        board's size: set where its cover leaves it visible and it is on
+        the image.
+        """
+        rect = self.piece_rect(piece, board, 1.0)
+        mask = pg.mask.from_surface(self.make_cover(piece, rect.size, 1.0))
+        mask.invert()
+        clipped = rect.clip(board)
+        if clipped != rect:
+            inside = pg.Mask(clipped.size, fill=True)
+            mask = mask.overlap_mask(inside, (clipped.x - rect.x, clipped.y - rect.y))
+        return mask
+
+    def load_cached(self, puzzle_image:pg.Surface):
+        """
+        Fill in piece images and neighbors from self.cache, which holds
+        full scale images. Returns False if there is no cache, no entry
+        for this image or the pieces are wanted at another scale.
+        """
+        if self.cache is None or self.render_scale != 1:
+            return False
+        self.cache_key = PuzzleCache.key(puzzle_image, self.shape, len(self.pieces))
+        entry = self.cache.get(self.cache_key)
+        if entry is None:
+            return False
+        cached, sides = entry
+        if cached.keys() != self.pieces.keys():
+            return False
+        for index, (image, neighbors) in cached.items():
+            piece = self.pieces[index]
+            piece.set_image(image)
+            self.image_scale = 1.0
+            piece.neighbors = {side: self.pieces.get(neighbor)
+                               for side, neighbor in zip(sides, neighbors)}
+        return True
+
+    def store_cached(self):
+        """Save the freshly sliced pieces to self.cache."""
+        if self.cache is None or self.image_scale != 1:
+            return
+        pieces = list(self.pieces.values())
+        sides = list(pieces[0].neighbors)
+        entry = {piece.index: (piece.upright_image, [neighbor.index if neighbor else (-1, -1)
+                                                     for neighbor in piece.neighbors.values()])
+                 for piece in pieces}
+        self.cache.put(self.cache_key, entry, sides)
+
+    @staticmethod
+    def piece_surface(image:pg.Surface, size:tuple[int, int]):
+        """A black surface for a piece of image, 8-bit with image's palette if image is."""
+        if image.get_bitsize() != 8:
+            return pg.Surface(size)
+        surf = pg.Surface(size, depth=8)
+        surf.set_palette(image.get_palette())
+        surf.fill(pg.Color("black"))
+        return surf
+
+    @staticmethod
+    def apply_cover(surf:pg.Surface, cover:pg.Surface):
+        """Black out surf where cover is opaque. Blits onto 8-bit ignore alpha, so those use a mask."""
+        if surf.get_bitsize() == 8:
+            pg.mask.from_surface(cover).to_surface(surf, setcolor=pg.Color("black"), unsetcolor=None)
+        else:
+            surf.blit(cover, (0, 0))
 
     def make_piece_img(self, image:pg.Surface, piece:PuzzlePiece):
         img_rect = image.get_rect()
+        rect = self.piece_rect(piece, img_rect, self.image_scale)
+        clipped = rect.clip(img_rect)
+        offset = clipped.x - rect.x, clipped.y - rect.y
+        surf = self.piece_surface(image, rect.size)
+        surf.blit(image.subsurface(clipped), offset)
+        self.apply_cover(surf, self.make_cover(piece, surf.get_size(), self.image_scale))
+        surf.set_colorkey(pg.Color("black"))
+        return surf
+
+    def piece_rect(self, piece:PuzzlePiece, img_rect:pg.Rect, scale:float):
+        """Where piece is cut from an image of img_rect, tabs included, may reach past its edges."""
         column, row = piece.index
         x = column * img_rect.w // 8
         y = row * img_rect.h // 8
-        rect = pg.Rect(x - img_rect.h // 32, y - img_rect.h // 32,
-                        3 * img_rect.w // 16, 3 * img_rect.h // 16)
+        return pg.Rect(x - img_rect.h // 32, y - img_rect.h // 32,
+                       3 * img_rect.w // 16, 3 * img_rect.h // 16)
+
+    def make_cover(self, piece:PuzzlePiece, size:tuple[int, int], scale:float):
+        """The cover of piece at size, opaque outside of the piece."""
+        column, row = piece.index
+        return pg.transform.scale(prepare.GFX[f"piece{column}-{row}"], size)
+
+class HexPuzzle(HexBoardModel, Puzzle):
+    piece_type = HexPuzzlePiece
+    section_type = HexPuzzleSection
+
+    def __init__(self, puzzle_image: pg.Surface, horizontalHexes, cache:PuzzleCache|None=None, spread=True):
+        HexBoardModel.__init__(self, horizontalHexes)
+        self.cache = cache
+        self.make_pieces(puzzle_image)
+        if spread:
+            self.spread_pieces(prepare.SCREEN_SIZE)
+
+    def make_piece_img(self, image:pg.Surface, piece:HexPuzzlePiece):
+        img_rect = image.get_rect()
+        scale = self.image_scale
+        rect = self.piece_rect(piece, img_rect, scale)
         clipped = rect.clip(img_rect)
         offset = clipped.x - rect.x, clipped.y - rect.y
-        surf = pg.Surface((3 * img_rect.w // 16, 3 * img_rect.h // 16))
+        surf = self.piece_surface(image, rect.size)
         surf.blit(image.subsurface(clipped), offset)
-        cover:pg.Surface = prepare.GFX[f"piece{column}-{row}"]
-        cover = pg.transform.scale(cover, [3 * img_rect.w // 16, 3 * img_rect.h // 16])
-        surf.blit(cover, (0, 0))
+        self.apply_cover(surf, self.make_cover(piece, rect.size, scale))
         surf.set_colorkey(pg.Color("black"))
         return surf
 
-    def spread_pieces(self):
-        screen_w, screen_h  = prepare.SCREEN_SIZE
-        w = screen_w // 9
-        h = screen_h // 9
-        positions = [(x * w, y * h)
-                for x in range(1, 9)
-                for y in range(1, 9)]
-        pieces = list(self.pieces.values())
-        for piece in pieces:
-            turns = randint(0, 3)
-            piece.rotate(90 * turns)
-        shuffle(pieces)
-        for p, pos in zip(pieces, positions):
-            p.set_pos(pos)
-            
-    def join_pieces(self, piece1:PuzzlePiece, piece2:PuzzlePiece):
-        p1 = pg.Rect((0, 0), piece1.size)
-        p2 = p1.copy()
-        p1.center = piece1.rect.center
-        for side in piece2.neighbors:
-            rotatedSide = piece2.getRotatedSide(side)
-            if piece1 is piece2.neighbors[side]:
-                if rotatedSide == "left":
-                    p2.left = p1.right
-                    p2.top = p1.top
-                elif rotatedSide == "right":
-                    p2.right = p1.left
-                    p2.top = p1.top
-                elif rotatedSide == "top":
-                    p2.top = p1.bottom
-                    p2.left = p1.left
-                elif rotatedSide == "bottom":
-                    p2.bottom = p1.top
-                    p2.left = p1.left
-        piece2.set_pos(p2.center)
-        section = PuzzleSection((piece1, piece2))
-        indices = (piece1.index, piece2.index)
-        for ind in indices:
-            try:
-                del self.pieces[ind]
-            except KeyError:
-                pass
-        self.sections.append(section)
-        
-class HexPuzzle(Puzzle):
-    def __init__(self, puzzle_image: pg.Surface, horizontalHexes):
-        self.sections:list[HexPuzzleSection] = []
-        self.make_pieces(puzzle_image, horizontalHexes)
-        self.spread_pieces()
-
-    def make_pieces(self, puzzle_image:pg.Surface, horizontalHexes:int):
-        self.pieces:dict[tuple[int,int],HexPuzzlePiece] = {}
-        img_rect:pg.Rect = puzzle_image.get_rect()
-        scalar = 800 / max(img_rect.size)
-        img_rect.width = scalar * img_rect.width
-        img_rect.height = scalar * img_rect.height
-        pieceW = img_rect.w / horizontalHexes
-        hexSize = pieceW / sqrt(3)
-        self.hexSize = hexSize
-        pieceH = 2 * hexSize
-        verticalHexes = ceil((img_rect.h - hexSize) / (1.5 * hexSize)) + 1
-        self.horizontalHexes = horizontalHexes
-        self.verticalHexes = verticalHexes
-        for row in range(0, verticalHexes):
-            rowParity = row % 2
-            for column in range(0, horizontalHexes + rowParity):
-                self.pieces[(column, row)] = HexPuzzlePiece((column, row), (int(pieceW), int(pieceH)))
-        self.set_image(puzzle_image)
-        for piece in self.pieces.values():
-            piece.get_neighbors(self.pieces)
-    
-    def make_piece_img(self, image:pg.Surface, piece:HexPuzzlePiece):
-        img_rect = image.get_rect()
-        vSpacing = piece.size[1] * .75
+    def piece_rect(self, piece:HexPuzzlePiece, img_rect:pg.Rect, scale:float):
+        """Where piece is cut from an image of img_rect scaled by scale, may reach past its edges."""
+        size = round(piece.size[0] * scale), round(piece.size[1] * scale)
+        vSpacing = piece.size[1] * .75 * scale
         vertical_offset = (img_rect.h - (self.verticalHexes - 1) * vSpacing) / 2
         column, row = piece.index
         rowParity = row % 2
         x = (column - rowParity/2) * img_rect.w / self.horizontalHexes
-        y = row * vSpacing + vertical_offset - piece.size[1] / 2
-        rect = pg.Rect(x, y, piece.size[0], piece.size[1])
-        clipped = rect.clip(img_rect)
-        offset = clipped.x - rect.x, clipped.y - rect.y
-        surf = pg.Surface(piece.size)
-        surf.blit(image.subsurface(clipped), offset)
-        hexSize = self.hexSize
-        centerx, centery = piece.size[0] / 2, piece.size[1] / 2
+        y = row * vSpacing + vertical_offset - size[1] / 2
+        return pg.Rect(x, y, size[0], size[1])
+
+    def make_cover(self, piece:HexPuzzlePiece, size:tuple[int, int], scale:float):
+        hexSize = self.hexSize * scale
+        centerx, centery = size[0] / 2, size[1] / 2
         hexPoints = [(centerx + hexSize * sin(pi * i / 3),
                       centery + hexSize * cos(pi * i / 3)) for i in range(6)]
-        cover = pg.Surface(piece.size)
+        cover = pg.Surface(size)
         cover.fill("black")
         pg.draw.polygon(cover, "white", hexPoints)
         cover.set_colorkey("white")
-        surf.blit(cover, (0, 0))
-        surf.set_colorkey(pg.Color("black"))
-        return surf
+        return cover
 
-    def spread_pieces(self):
-        screen_w, screen_h  = prepare.SCREEN_SIZE
-        w = screen_w // 9
-        h = screen_h // 9
+    def make_shapes(self, image_size:tuple[int, int]):
+        """
+        Hexagons share one shape, except those along the edges that are
+        partly off the image and only keep the part on it.
+        """
+        board = pg.Rect((0, 0), self.scaled_size(image_size, 1.0))
+        shared = None
         for piece in self.pieces.values():
-            piece.set_pos((randint(w, w * 8), randint(h, h * 8)))
-            turns = randint(0,5)
-            piece.rotate(60 * turns)
-
-    def join_pieces(self, piece1:HexPuzzlePiece, piece2:HexPuzzlePiece):
-        p1 = pg.Rect((0, 0), piece1.size)
-        p2 = p1.copy()
-        p1.center = piece1.rect.center
-        vSpacing = piece1.size[1] * 3 // 4
-        for side in piece2.neighbors:
-            rotatedSide = piece2.getRotatedSide(side)
-            if piece1 is piece2.neighbors[side]:
-                if rotatedSide == "left":
-                    p2.left = p1.right
-                    p2.top = p1.top
-                elif rotatedSide == "right":
-                    p2.right = p1.left
-                    p2.top = p1.top
-                elif rotatedSide == "topleft":
-                    p2.centerx = p1.right
-                    p2.top = p1.top + vSpacing
-                elif rotatedSide == "topright":
-                    p2.centerx = p1.left
-                    p2.top = p1.top + vSpacing
-                elif rotatedSide == "bottomleft":
-                    p2.centerx = p1.right
-                    p2.top = p1.top - vSpacing
-                elif rotatedSide == "bottomright":
-                    p2.centerx = p1.left
-                    p2.top = p1.top - vSpacing
-        piece2.set_pos(p2.center)
-        section = HexPuzzleSection((piece1, piece2))
-        indices = (piece1.index, piece2.index)
-        for ind in indices:
-            try:
-                del self.pieces[ind]
-            except KeyError:
-                pass
-        self.sections.append(section)
-
+            if not board.contains(self.piece_rect(piece, board, 1.0)):
+                piece.shape = PieceShape(self.make_mask(piece, board), piece.turn)
+                continue
+            if shared is None:
+                shared = PieceShape(self.make_mask(piece, board), piece.turn)
+            piece.shape = shared
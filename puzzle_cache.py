@@ -0,0 +1,148 @@
+import os
+import mmap
+import struct
+import hashlib
+import pygame as pg
+from puzzle_model import BOARD_SIZE
+
+MAGIC = b"PZC1"
+# part of every key, bump it whenever Puzzle slices or covers pieces
+# differently so entries from before are not served
+SLICE_VERSION = 2
+# magic, piece count, side count, length of the side names
+HEADER = struct.Struct("<4sHHH")
+# column, row, width, height, offset of the RGB pixels in the file
+RECORD = struct.Struct("<HHHHQ")
+# column and row of one neighbor, (-1, -1) for none
+NEIGHBOR = struct.Struct("<hh")
+
+
+class PuzzleCache(object):
+    """
+    Content addressed disk cache of sliced puzzles. An entry holds the
+    piece images and neighbor tables of one puzzle, keyed by the hash of
+    the source image, the slicing version and board size, the shape and
+    the piece count. Entries are memory mapped on load and the least
+    recently used ones are evicted once the directory grows past
+    max_bytes.
+    """
+    def __init__(self, directory:str, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(image:pg.Surface, shape:str, piece_count:int):
+        digest = hashlib.blake2b(pg.image.tobytes(image, "RGB"), digest_size=16)
+        digest.update(struct.pack("<IIII", *image.get_size(), SLICE_VERSION, BOARD_SIZE))
+        return f"{digest.hexdigest()}-{shape}-{piece_count}"
+
+    def path(self, key:str):
+        return os.path.join(self.directory, key + ".pzc")
+
+    def get(self, key:str):
+        """
+        Returns {index: (image, neighbor indices)} and the side names the
+        neighbor indices are listed in, or None on a miss. Images are views
+        on a private mapping of the file.
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            # unreadable, or empty so it can't be mapped
+            self.discard(path)
+            return None
+        try:
+            entry = self.parse(data)
+        except (struct.error, ValueError, UnicodeDecodeError):
+            entry = None
+        if entry is None:
+            self.discard(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    @staticmethod
+    def parse(data:mmap.mmap):
+        """Read an entry from its mapping, None if it isn't one. Raises on truncated or garbled entries."""
+        magic, count, side_count, names_len = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            return None
+        offset = HEADER.size
+        sides = bytes(data[offset:offset + names_len]).decode().split(",")
+        offset += names_len
+        view = memoryview(data)
+        pieces = {}
+        for _ in range(count):
+            column, row, w, h, pixels = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            neighbors = []
+            for _ in range(side_count):
+                neighbors.append(NEIGHBOR.unpack_from(data, offset))
+                offset += NEIGHBOR.size
+            if pixels + w * h * 3 > len(data):
+                raise ValueError("piece pixels run past the end of the entry")
+            image = pg.image.frombuffer(view[pixels:pixels + w * h * 3], (w, h), "RGB")
+            image.set_colorkey(pg.Color("black"))
+            pieces[(column, row)] = (image, neighbors)
+        return pieces, sides
+
+    @staticmethod
+    def discard(path:str):
+        """Remove a bad entry so it is rebuilt instead of failing every load."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def put(self, key:str, pieces:dict, sides:list[str]):
+        """
+        Write an entry. pieces maps index -> (image, neighbor indices in
+        the order of sides).
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        names = ",".join(sides).encode()
+        offset = HEADER.size + len(names) + len(pieces) * (RECORD.size + len(sides) * NEIGHBOR.size)
+        table = bytearray(HEADER.pack(MAGIC, len(pieces), len(sides), len(names)) + names)
+        blobs = []
+        for (column, row), (image, neighbors) in pieces.items():
+            w, h = image.get_size()
+            table += RECORD.pack(column, row, w, h, offset)
+            for neighbor in neighbors:
+                table += NEIGHBOR.pack(*neighbor)
+            blob = pg.image.tobytes(image, "RGB")
+            blobs.append(blob)
+            offset += len(blob)
+        path = self.path(key)
+        temp = path + ".tmp"
+        with open(temp, "wb") as f:
+            f.write(table)
+            for blob in blobs:
+                f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".pzc"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,577 @@
+"""
+Display independent puzzle model: piece positions, orientations, neighbors,
+sections and the rules for joining them. Nothing here imports pygame, so
+boards can be built, joined and solved in worker processes, on a server or
+in tests. puzzle.py and puzzle_piece.py subclass these classes and add the
+images.
+"""
+from random import randint, shuffle, uniform
+from math import sqrt, ceil, radians, cos, sin
+from typing import Self
+
+BOARD_SIZE = 800
+
+
+def close_enough(value, target, tolerance=7):
+    return target - tolerance <= value <= target + tolerance
+
+
+class Box(object):
+    """
+    Just enough of pg.Rect's integer geometry for the join rules,
+    including its truncation of assigned floats.
+    """
+    def __init__(self, size:tuple[int,int], center:tuple[int,int]=(0, 0)):
+        self.w, self.h = size
+        self.x = int(center[0]) - self.w // 2
+        self.y = int(center[1]) - self.h // 2
+
+    @property
+    def left(self): return self.x
+    @left.setter
+    def left(self, value): self.x = int(value)
+
+    @property
+    def top(self): return self.y
+    @top.setter
+    def top(self, value): self.y = int(value)
+
+    @property
+    def right(self): return self.x + self.w
+    @right.setter
+    def right(self, value): self.x = int(value) - self.w
+
+    @property
+    def bottom(self): return self.y + self.h
+    @bottom.setter
+    def bottom(self, value): self.y = int(value) - self.h
+
+    @property
+    def centerx(self): return self.x + self.w // 2
+    @centerx.setter
+    def centerx(self, value): self.x = int(value) - self.w // 2
+
+    @property
+    def centery(self): return self.y + self.h // 2
+    @centery.setter
+    def centery(self, value): self.y = int(value) - self.h // 2
+
+    @property
+    def center(self): return self.centerx, self.centery
+
+
+def scatter(sizes:list[tuple[int,int]], area:tuple[int,int], margin=1/18, min_scale=1.0):
+    """
+    Centers for boxes of sizes spread over area without overlap.
+    The boxes are packed on shelves, rows filled left to right tallest
+    first, and the room left over is shared out between the shelves and
+    between the boxes on each shelf, with a random share in front of each.
+    If the boxes don't fit at full size they are packed again a little
+    smaller, down to min_scale, and if that doesn't fit either the
+    shelves are pushed together and overlap evenly. O(n log n) in the
+    number of boxes.
+    """
+    left, top = int(area[0] * margin), int(area[1] * margin)
+    width, height = area[0] - 2 * left, area[1] - 2 * top
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True)
+    scale = 1.0
+    while True:
+        # each shelf is [height, used width, box indices]
+        shelves = []
+        for i in order:
+            w, h = int(sizes[i][0] * scale), int(sizes[i][1] * scale)
+            if not shelves or shelves[-1][1] + w > width:
+                shelves.append([h, 0, []])
+            shelves[-1][1] += w
+            shelves[-1][2].append(i)
+        used = sum(shelf[0] for shelf in shelves)
+        if used <= height or scale <= min_scale:
+            break
+        scale = max(min_scale, scale * 0.9)
+    shuffle(shelves)
+    positions:list[tuple[int,int]] = [(0, 0)] * len(sizes)
+    spare_y = (height - used) / len(shelves) if shelves else 0
+    y = top
+    for shelf_h, shelf_w, boxes in shelves:
+        spare_x = (width - shelf_w) / len(boxes)
+        x = left
+        for i in boxes:
+            w, h = int(sizes[i][0] * scale), int(sizes[i][1] * scale)
+            dx = uniform(0, spare_x)
+            dy = uniform(0, spare_y + shelf_h - h) if spare_y >= 0 else 0
+            positions[i] = (int(x + dx + w / 2), int(y + dy + h / 2))
+            x += w + spare_x
+        y += shelf_h + spare_y
+    return positions
+
+
+class PieceModel(object):
+    turn = 90
+    # outer size of a piece with its tabs, relative to size
+    tabs = 1.5
+
+    def __init__(self, index:tuple[int,int], size:tuple[int,int]):
+        self.index = index
+        self.size = size
+        self.center = (index[0] * size[0] + size[0] // 2, index[1] * size[1] + size[1] // 2)
+        self.neighbors:dict[str, Self|None] = {}
+        self.grabbed = False
+        self.grab_offset:tuple = (0, 0)
+        self.orientation = 0
+
+    def set_pos(self, pos:tuple[int, int]):
+        self.center = (int(pos[0]), int(pos[1]))
+
+    def footprint(self):
+        """Width and height taken up on the table in the current orientation, tabs included."""
+        w, h = int(self.size[0] * self.tabs), int(self.size[1] * self.tabs)
+        return (h, w) if self.orientation * self.turn % 180 else (w, h)
+
+    def move_ip(self, delta:tuple[int,int]):
+        self.center = (self.center[0] + int(delta[0]), self.center[1] + int(delta[1]))
+
+    def get_neighbors(self, piece_dict:dict[tuple[int,int],Self]):
+        self.neighbors = {}
+        offsets = ((-1, 0), (1, 0), (0, -1), (0, 1))
+        directions = ("left", "right", "top", "bottom")
+        sides = {offset: direct for offset, direct in zip(offsets, directions)}
+        for offset in offsets:
+            neighbor_index = self.index[0] + offset[0], self.index[1] + offset[1]
+            try:
+                neighbor = piece_dict[neighbor_index]
+            except KeyError:
+                neighbor = None
+            self.neighbors[sides[offset]] = neighbor
+
+    def is_joinable(self, other:Self):
+        if self.orientation != other.orientation:
+            return False
+        for side in self.neighbors:
+            rotatedSide = self.getRotatedSide(side)
+            if other is self.neighbors[side]:
+                r1 = Box(self.size, self.center)
+                r2 = Box(self.size, other.center)
+                pos_pairs = {
+                        "left": ((r1.left, r2.right), (r1.top, r2.top)),
+                        "right": ((r1.right, r2.left), (r1.top, r2.top)),
+                        "top": ((r1.left, r2.left), (r1.top, r2.bottom)),
+                        "bottom": ((r1.left, r2.left), (r1.bottom, r2.top))}
+                if all((close_enough(*pair) for pair in pos_pairs[rotatedSide])):
+                    return True
+        return False
+
+    def rotate(self, degrees=None):
+        if degrees is None:
+            degrees = self.turn
+        assert degrees % self.turn == 0
+        self.orientation = (self.orientation + degrees // self.turn) % (360 // self.turn)
+
+    def getRotatedSide(self, side:str):
+        return [{"left":"left","right":"right","top":"top","bottom":"bottom"},
+                {"left":"bottom","right":"top","top":"left","bottom":"right"},
+                {"left":"right","right":"left","top":"bottom","bottom":"top"},
+                {"left":"top","right":"bottom","top":"right","bottom":"left"}
+                ][self.orientation][side]
+
+
+class SectionModel(object):
+    def __init__(self, pieces:tuple[PieceModel, PieceModel]):
+        """A group of pieces that have been connected together."""
+        self.pieces:list[PieceModel] = list(pieces)
+        self.grabbed = False
+        self.grab_offset = (0, 0)
+        self.grabbed_piece = None
+        self.orientation = pieces[0].orientation
+
+    def hold(self, pos:tuple):
+        """Start moving the section with pos as the point being held."""
+        for piece in self.pieces:
+            piece.grab_offset = piece.center[0] - pos[0], piece.center[1] - pos[1]
+        self.grabbed = True
+
+    def set_pos(self, pos:tuple):
+        for piece in self.pieces:
+            x, y = piece.grab_offset
+            piece.set_pos((pos[0] + x, pos[1] + y))
+
+    def release(self):
+        self.grabbed = False
+        for piece in self.pieces:
+            piece.grab_offset = (0, 0)
+
+    def can_add(self, piece:PieceModel):
+        return any((piece.is_joinable(s_piece) for s_piece in self.pieces))
+
+    def can_add_section(self, section:Self):
+        for piece in section.pieces:
+            if self.can_add(piece):
+                return True
+        return False
+
+    def add_piece(self, piece:PieceModel, loose_pieces:dict[tuple[int,int],PieceModel]):
+        for s_piece in self.pieces:
+            for side in piece.neighbors:
+                rotatedSide = piece.getRotatedSide(side)
+                if s_piece is piece.neighbors[side]:
+                    p1 = Box(piece.size, s_piece.center)
+                    p2 = Box(piece.size)
+                    if rotatedSide == "left":
+                        p2.left = p1.right
+                        p2.top = p1.top
+                    elif rotatedSide == "right":
+                        p2.right = p1.left
+                        p2.top = p1.top
+                    elif rotatedSide == "top":
+                        p2.top = p1.bottom
+                        p2.left = p1.left
+                    elif rotatedSide == "bottom":
+                        p2.bottom = p1.top
+                        p2.left = p1.left
+                    piece.set_pos(p2.center)
+                    self.pieces.append(piece)
+                    piece.grabbed = False
+                    index_ = piece.index
+                    del loose_pieces[index_]
+                    return
+
+    def add_section(self, other_section:Self):
+        other_pieces = other_section.pieces
+        for other_piece in other_pieces:
+            for piece in self.pieces:
+                for side in piece.neighbors:
+                    rotatedSide = piece.getRotatedSide(side)
+                    if other_piece is piece.neighbors[side]:
+                        p1 = Box(piece.size, piece.center)
+                        p2 = Box(piece.size, other_piece.center)
+                        if rotatedSide == "left":
+                            x_diff = p1.left - p2.right
+                            y_diff = p1.top - p2.top
+                        elif rotatedSide == "right":
+                            x_diff = p1.right - p2.left
+                            y_diff = p1.top - p2.top
+                        elif rotatedSide == "top":
+                            y_diff = p1.top - p2.bottom
+                            x_diff = p1.left - p2.left
+                        elif rotatedSide == "bottom":
+                            y_diff = p1.bottom - p2.top
+                            x_diff = p1.left - p2.left
+                        for piece_ in other_section.pieces:
+                            piece_.move_ip((x_diff, y_diff))
+                            self.pieces.append(piece_)
+                        self.grabbed = False
+                        return
+
+    def rotate(self, degrees=90):
+        assert degrees % 90 == 0
+        ndts = (degrees // 90) % 4
+        for piece in self.pieces:
+            piece.rotate(degrees)
+            piece.grab_offset = [(piece.grab_offset[0], piece.grab_offset[1]),
+                                 (piece.grab_offset[1], -piece.grab_offset[0]),
+                                 (-piece.grab_offset[0], -piece.grab_offset[1]),
+                                 (-piece.grab_offset[1], piece.grab_offset[0])][ndts]
+
+
+class HexPieceModel(PieceModel):
+    turn = 60
+    tabs = 1.0
+
+    def footprint(self):
+        # turning a hexagon by 60 degrees leaves its bounds as they were
+        return self.size
+
+    def get_neighbors(self, piece_dict:dict[tuple[int,int],Self]):
+        self.neighbors = {}
+        parity = self.index[1] % 2
+        offsets = [((-1, 0), (1, 0), (0, -1), (1, -1), (0, 1), (1, 1)),
+                   ((-1, 0), (1, 0), (-1, -1), (0, -1), (-1, 1), (0, 1))][parity]
+        directions = ("left", "right", "topleft", "topright", "bottomleft", "bottomright")
+        sides = {offset: direct for offset, direct in zip(offsets, directions)}
+        for offset in offsets:
+            neighbor_index = self.index[0] + offset[0], self.index[1] + offset[1]
+            try:
+                neighbor = piece_dict[neighbor_index]
+            except KeyError:
+                neighbor = None
+            self.neighbors[sides[offset]] = neighbor
+
+    def is_joinable(self, other: Self):
+        if self.orientation != other.orientation:
+            return False
+        vSpacing = self.size[1] * 3 / 4
+        for side in self.neighbors:
+            rotatedSide = self.getRotatedSide(side)
+            if other is self.neighbors[side]:
+                r1 = Box(self.size, self.center)
+                r2 = Box(self.size, other.center)
+                pos_pairs = {
+                        "left": ((r1.left, r2.right), (r1.top, r2.top)),
+                        "right": ((r1.right, r2.left), (r1.top, r2.top)),
+                        "topleft": ((r1.left, r2.centerx), (r1.top - r2.top, vSpacing)),
+                        "topright": ((r1.right, r2.centerx), (r1.top - r2.top, vSpacing)),
+                        "bottomleft": ((r1.left, r2.centerx), (r2.top - r1.top, vSpacing)),
+                        "bottomright": ((r1.right, r2.centerx), (r2.top - r1.top, vSpacing))}
+                if all((close_enough(*pair) for pair in pos_pairs[rotatedSide])):
+                    return True
+        return False
+
+    def getRotatedSide(self, side: str):
+        sides = ["right","topright","topleft","left","bottomleft","bottomright"]
+        sideIndex = sides.index(side)
+        rotatedIndex = (sideIndex + self.orientation) % 6
+        return sides[rotatedIndex]
+
+
+class HexSectionModel(SectionModel):
+    def add_piece(self, piece, loose_pieces):
+        vSpacing = piece.size[1] * 3 / 4
+        for s_piece in self.pieces:
+            for side in piece.neighbors:
+                rotatedSide = piece.getRotatedSide(side)
+                if s_piece is piece.neighbors[side]:
+                    p1 = Box(piece.size, s_piece.center)
+                    p2 = Box(piece.size)
+                    if rotatedSide == "left":
+                        p2.left = p1.right
+                        p2.top = p1.top
+                    elif rotatedSide == "right":
+                        p2.right = p1.left
+                        p2.top = p1.top
+                    elif rotatedSide == "topleft":
+                        p2.centerx = p1.right
+                        p2.top = p1.top + vSpacing
+                    elif rotatedSide == "topright":
+                        p2.centerx = p1.left
+                        p2.top = p1.top + vSpacing
+                    elif rotatedSide == "bottomleft":
+                        p2.centerx = p1.right
+                        p2.top = p1.top - vSpacing
+                    elif rotatedSide == "bottomright":
+                        p2.centerx = p1.left
+                        p2.top = p1.top - vSpacing
+                    piece.set_pos(p2.center)
+                    self.pieces.append(piece)
+                    piece.grabbed = False
+                    index_ = piece.index
+                    del loose_pieces[index_]
+                    return
+
+    def add_section(self, other_section: Self):
+        other_pieces = other_section.pieces
+        vSpacing = other_pieces[0].size[1] * 3 / 4
+        for other_piece in other_pieces:
+            for piece in self.pieces:
+                for side in piece.neighbors:
+                    rotatedSide = piece.getRotatedSide(side)
+                    if other_piece is piece.neighbors[side]:
+                        p1 = Box(piece.size, piece.center)
+                        p2 = Box(piece.size, other_piece.center)
+                        if rotatedSide == "left":
+                            y_diff = p1.top - p2.top
+                            x_diff = p1.left - p2.right
+                        elif rotatedSide == "right":
+                            y_diff = p1.top - p2.top
+                            x_diff = p1.right - p2.left
+                        elif rotatedSide == "topleft":
+                            y_diff = p1.top - p2.top - vSpacing
+                            x_diff = p1.left - p2.centerx
+                        elif rotatedSide == "topright":
+                            y_diff = p1.top - p2.top - vSpacing
+                            x_diff = p1.right - p2.centerx
+                        elif rotatedSide == "bottomleft":
+                            y_diff = p1.top - p2.top + vSpacing
+                            x_diff = p1.left - p2.centerx
+                        elif rotatedSide == "bottomright":
+                            y_diff = p1.top - p2.top + vSpacing
+                            x_diff = p1.right - p2.centerx
+                        for piece_ in other_section.pieces:
+                            piece_.move_ip((x_diff, y_diff))
+                            self.pieces.append(piece_)
+                        self.grabbed = False
+                        return
+
+    def rotate(self, degrees=60):
+        assert degrees % 60 == 0
+        rad = -radians(degrees)
+        for piece in self.pieces:
+            piece.rotate(degrees)
+            x, y = piece.grab_offset
+            piece.grab_offset = (x * cos(rad) - y * sin(rad),
+                                 x * sin(rad) + y * cos(rad))
+
+
+class BoardModel(object):
+    """
+    The loose pieces and sections of one board and the rules for dropping
+    and joining them. piece_type and section_type let subclasses fill the
+    board with pieces and sections that also carry images.
+    """
+    shape = "puzzle"
+    piece_type = PieceModel
+    section_type = SectionModel
+
+    def __init__(self):
+        self.pieces:dict[tuple[int,int], PieceModel] = {}
+        self.sections:list[SectionModel] = []
+
+    def layout(self, image_size:tuple[int,int]):
+        """Create the unjoined pieces for an image of image_size."""
+        self.pieces = {}
+        scalar = BOARD_SIZE / max(image_size)
+        pieceW = int(image_size[0] / 8 * scalar)
+        pieceH = int(image_size[1] / 8 * scalar)
+        for column in range(0, 8):
+            for row in range(0, 8):
+                self.pieces[(column, row)] = self.piece_type((column, row), (pieceW, pieceH))
+
+    def link_neighbors(self):
+        for piece in self.pieces.values():
+            piece.get_neighbors(self.pieces)
+
+    def is_complete(self):
+        return len(self.sections) + len(self.pieces) == 1
+
+    def spread_pieces(self, area:tuple[int,int]):
+        """
+        Turn every piece by a random number of turns and scatter them over
+        area without overlap, see scatter. Pieces may only overlap by
+        their tabs, or further if even their bodies don't fit.
+        """
+        pieces = list(self.pieces.values())
+        for piece in pieces:
+            piece.rotate(piece.turn * randint(0, 360 // piece.turn - 1))
+        sizes = [piece.footprint() for piece in pieces]
+        min_scale = 1 / pieces[0].tabs if pieces else 1.0
+        for piece, pos in zip(pieces, scatter(sizes, area, min_scale=min_scale)):
+            piece.set_pos(pos)
+
+    def drop_piece(self, piece:PieceModel):
+        """
+        Checks whether a released loose piece can be joined with any of
+        the other unjoined pieces, and failing that with any of the
+        existing sections. Returns True if the piece was joined.
+        """
+        for other in self.pieces.values():
+            if piece.is_joinable(other):
+                self.join_pieces(piece, other)
+                return True
+        for section in self.sections:
+            if section.can_add(piece):
+                section.add_piece(piece, self.pieces)
+                return True
+        return False
+
+    def drop_section(self, section:SectionModel):
+        """
+        Similar to drop_piece but for a released section, which can absorb
+        another section or a loose piece. Returns True if anything was joined.
+        """
+        for other in [x for x in self.sections if x is not section]:
+            if section.can_add_section(other):
+                section.add_section(other)
+                self.sections.remove(other)
+                section.release()
+                return True
+        for piece in self.pieces.values():
+            if section.can_add(piece):
+                section.add_piece(piece, self.pieces)
+                section.release()
+                return True
+        return False
+
+    def join_pieces(self, piece1:PieceModel, piece2:PieceModel):
+        p1 = Box(piece1.size, piece1.center)
+        p2 = Box(piece1.size)
+        for side in piece2.neighbors:
+            rotatedSide = piece2.getRotatedSide(side)
+            if piece1 is piece2.neighbors[side]:
+                if rotatedSide == "left":
+                    p2.left = p1.right
+                    p2.top = p1.top
+                elif rotatedSide == "right":
+                    p2.right = p1.left
+                    p2.top = p1.top
+                elif rotatedSide == "top":
+                    p2.top = p1.bottom
+                    p2.left = p1.left
+                elif rotatedSide == "bottom":
+                    p2.bottom = p1.top
+                    p2.left = p1.left
+        piece2.set_pos(p2.center)
+        section = self.section_type((piece1, piece2))
+        indices = (piece1.index, piece2.index)
+        for ind in indices:
+            try:
+                del self.pieces[ind]
+            except KeyError:
+                pass
+        self.sections.append(section)
+
+
+class HexBoardModel(BoardModel):
+    shape = "hexagon"
+    piece_type = HexPieceModel
+    section_type = HexSectionModel
+
+    def __init__(self, horizontalHexes:int):
+        BoardModel.__init__(self)
+        self.horizontalHexes = horizontalHexes
+
+    def layout(self, image_size:tuple[int,int]):
+        self.pieces = {}
+        scalar = BOARD_SIZE / max(image_size)
+        width = int(scalar * image_size[0])
+        height = int(scalar * image_size[1])
+        pieceW = width / self.horizontalHexes
+        hexSize = pieceW / sqrt(3)
+        self.hexSize = hexSize
+        pieceH = 2 * hexSize
+        verticalHexes = ceil((height - hexSize) / (1.5 * hexSize)) + 1
+        self.verticalHexes = verticalHexes
+        for row in range(0, verticalHexes):
+            rowParity = row % 2
+            for column in range(0, self.horizontalHexes + rowParity):
+                self.pieces[(column, row)] = self.piece_type((column, row), (int(pieceW), int(pieceH)))
+
+    def join_pieces(self, piece1:HexPieceModel, piece2:HexPieceModel):
+        p1 = Box(piece1.size, piece1.center)
+        p2 = Box(piece1.size)
+        vSpacing = piece1.size[1] * 3 // 4
+        for side in piece2.neighbors:
+            rotatedSide = piece2.getRotatedSide(side)
+            if piece1 is piece2.neighbors[side]:
+                if rotatedSide == "left":
+                    p2.left = p1.right
+                    p2.top = p1.top
+                elif rotatedSide == "right":
+                    p2.right = p1.left
+                    p2.top = p1.top
+                elif rotatedSide == "topleft":
+                    p2.centerx = p1.right
+                    p2.top = p1.top + vSpacing
+                elif rotatedSide == "topright":
+                    p2.centerx = p1.left
+                    p2.top = p1.top + vSpacing
+                elif rotatedSide == "bottomleft":
+                    p2.centerx = p1.right
+                    p2.top = p1.top - vSpacing
+                elif rotatedSide == "bottomright":
+                    p2.centerx = p1.left
+                    p2.top = p1.top - vSpacing
+        piece2.set_pos(p2.center)
+        section = self.section_type((piece1, piece2))
+        indices = (piece1.index, piece2.index)
+        for ind in indices:
+            try:
+                del self.pieces[ind]
+            except KeyError:
+                pass
+        self.sections.append(section)
+
+
+def make_board(shape="puzzle", image_size:tuple[int,int]=(BOARD_SIZE, BOARD_SIZE), horizontalHexes=8):
+    """A headless board laid out like Puzzle/HexPuzzle would for image_size, unspread."""
+    board = HexBoardModel(horizontalHexes) if shape == "hexagon" else BoardModel()
+    board.layout(image_size)
+    board.link_neighbors()
+    return board
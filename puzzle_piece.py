@@ -1,329 +1,156 @@
 import pygame as pg
-from typing import Self
-from math import radians, cos, sin
+from blit_format import BLIT_FORMAT, STILL_DRAWS
+from puzzle_model import PieceModel, SectionModel, HexPieceModel, HexSectionModel
+
+class PieceShape(object):
+    """
+    The outline of a piece as a pg.Mask in board pixels per orientation,
+    made from its cover rather than from any image so it holds for every
+    camera or animation frame. Turned masks are made on first use, pieces
+    with the same cover can share one PieceShape.
+    """
+    def __init__(self, upright:pg.Mask, turn:int):
+        self.turn = turn
+        self.masks = {0: upright}
+        self.bounds:dict[int, pg.Rect] = {}
+
+    def mask(self, orientation:int):
+        mask = self.masks.get(orientation)
+        if mask is None:
+            surface = self.masks[0].to_surface(unsetcolor=(0, 0, 0, 0))
+            mask = pg.mask.from_surface(pg.transform.rotate(surface, orientation * self.turn))
+            self.masks[orientation] = mask
+        return mask
+
+    def bounding_rect(self, orientation:int):
+        """Bounds of the mask's set bits, relative to the mask."""
+        bounds = self.bounds.get(orientation)
+        if bounds is None:
+            mask = self.mask(orientation)
+            rects = mask.get_bounding_rects()
+            bounds = rects[0].unionall(rects[1:]) if rects else mask.get_rect()
+            self.bounds[orientation] = bounds
+        return bounds
+
+class PuzzlePiece(PieceModel):
+    """
+    A PieceModel with its image. self.rect is the rotated image's rect,
+    always centered on the model's center, and self.collision the
+    bounding rect of its shape. Both are in board coordinates, the image
+    may be smaller by self.scale, see Game.set_render_scale.
+    """
+    # set by Game when drawing through a TextureScreen, which turns the
+    # upright image itself so image is never rotated on the CPU
+    textured = False
 
-def close_enough(value, target, tolerance=7):
-    return target - tolerance <= value <= target + tolerance
-
-class PuzzlePiece(object):
     def __init__(self, index:tuple[int,int], size:tuple[int,int]):
-        self.index = index
+        super(PuzzlePiece, self).__init__(index, size)
         self.image:pg.Surface
-        self.size = size
-        self.rect = pg.Rect((index[0]*size[0], index[1]*size[1]), size)
+        self.upright_image:pg.Surface
+        self.scale = 1.0
+        self.draws = STILL_DRAWS
+        # which of its puzzle's images the piece was last sliced from
+        self.image_serial = 0
+        # set by Puzzle.make_shapes, picking falls back to collision without it
+        self.shape:PieceShape|None = None
+        # (scale, image) drawn in place of image at a scale it wasn't sliced at
+        self.fitted:tuple[float, pg.Surface]|None = None
+        self.rect = pg.Rect((0, 0), size)
+        self.rect.center = self.center
         self.collision = self.rect.copy()
-        self.grabbed = False
-        self.grab_offset:tuple
-        self.orientation = 0
+
+    def sync(self):
+        """Move rect and collision to follow the model's center."""
+        dx = self.center[0] - self.rect.centerx
+        dy = self.center[1] - self.rect.centery
+        self.rect.move_ip(dx, dy)
+        self.collision.move_ip(dx, dy)
 
     def set_pos(self, pos:tuple[int, int]):
-        old = self.rect.center
-        self.rect.center = pos
-        new = self.rect.center
-        self.collision.move_ip(new[0] - old[0], new[1] - old[1])
+        super(PuzzlePiece, self).set_pos(pos)
+        self.sync()
 
     def move_ip(self, delta:tuple[int,int]):
-        self.rect.move_ip(delta)
-        self.collision.move_ip(delta)
-
-    def get_neighbors(self, piece_dict:dict[tuple[int,int],Self]):
-        self.neighbors = {}
-        offsets = ((-1, 0), (1, 0), (0, -1), (0, 1))
-        directions = ("left", "right", "top", "bottom")
-        sides = {offset: direct for offset, direct in zip(offsets, directions)}
-        for offset in offsets:
-            neighbor_index = self.index[0] + offset[0], self.index[1] + offset[1]
-            try:
-                neighbor = piece_dict[neighbor_index]
-            except KeyError:
-                neighbor = None
-            self.neighbors[sides[offset]] = neighbor
+        super(PuzzlePiece, self).move_ip(delta)
+        self.sync()
 
-    def is_joinable(self, other:Self):
-        if self.orientation != other.orientation:
+    def collide(self, pos:tuple[int, int]):
+        """Whether pos is on the piece: collision first, then the shape's mask."""
+        if not self.collision.collidepoint(pos):
             return False
-        for side in self.neighbors:
-            rotatedSide = self.getRotatedSide(side)
-            if other is self.neighbors[side]:
-                r1 = pg.Rect((0,0), self.size)
-                r2 = r1.copy()
-                r1.center = self.rect.center
-                r2.center = other.rect.center
-                pos_pairs = {
-                        "left": ((r1.left, r2.right), (r1.top, r2.top)),
-                        "right": ((r1.right, r2.left), (r1.top, r2.top)),
-                        "top": ((r1.left, r2.left), (r1.top, r2.bottom)),
-                        "bottom": ((r1.left, r2.left), (r1.bottom, r2.top))}
-                if all((close_enough(*pair) for pair in pos_pairs[rotatedSide])):
-                    return True
-        return False
-
-    def draw(self, surface:pg.Surface):
-        surface.blit(self.image, self.rect)
-
-    def rotate(self, degrees=90):
-        assert degrees % 90 == 0
-        ndts = degrees // 90
-        self.image = pg.transform.rotate(self.image, degrees)
-        self.rect = self.image.get_rect()
-        self.collision = self.image.get_bounding_rect()
-        self.collision.move_ip(self.rect.topleft)
-        self.orientation = (self.orientation + ndts) % 4
-
-    def getRotatedSide(self, side:str):
-        return [{"left":"left","right":"right","top":"top","bottom":"bottom"},
-                {"left":"bottom","right":"top","top":"left","bottom":"right"},
-                {"left":"right","right":"left","top":"bottom","bottom":"top"},
-                {"left":"top","right":"bottom","top":"right","bottom":"left"}
-                ][self.orientation][side]
-    
-    def set_image(self, image:pg.Surface):
-        self.image = pg.transform.rotate(image, self.orientation * 90)
-        self.rect = self.image.get_rect(center=self.rect.center)
-        self.collision = self.image.get_bounding_rect()
-        self.collision.move_ip(self.rect.topleft)
-
-class PuzzleSection(object):
-    def __init__(self, pieces:tuple[PuzzlePiece, PuzzlePiece]):
-        """A group of PuzzlePieces that have been connected together."""
-        self.pieces:list[PuzzlePiece] = list(pieces)
-        self.grabbed = False
-        self.grab_offset = (0, 0)
-        self.grabbed_piece = None
-        self.orientation = pieces[0].orientation
-
+        if self.shape is None:
+            return True
+        mask = self.shape.mask(self.orientation)
+        w, h = mask.get_size()
+        x, y = pos[0] - self.center[0] + w // 2, pos[1] - self.center[1] + h // 2
+        return 0 <= x < w and 0 <= y < h and bool(mask.get_at((x, y)))
+
+    def draw(self, surface:pg.Surface, scale=1.0):
+        """
+        Draw onto surface at scale times board resolution. An image sliced
+        at another scale, as happens while the render scale changes and
+        the pieces are sliced again, is scaled to fit on the way.
+        """
+        draw_piece = getattr(surface, "draw_piece", None)
+        if draw_piece is not None:
+            draw_piece(self)
+        elif scale == 1 and self.scale == 1:
+            surface.blit(self.image, self.rect)
+        else:
+            image = self.image
+            if self.scale != scale:
+                if self.fitted is None or self.fitted[0] != scale:
+                    self.fitted = scale, pg.transform.scale_by(image, scale / self.scale)
+                image = self.fitted[1]
+            center = self.center[0] * scale, self.center[1] * scale
+            surface.blit(image, image.get_rect(center=center))
+
+    def rotate(self, degrees=None):
+        super(PuzzlePiece, self).rotate(degrees)
+        self.update_image()
+
+    def set_image(self, image:pg.Surface, scale=1.0, draws=STILL_DRAWS):
+        """draws is how often the image is expected to be blitted before it is replaced."""
+        self.upright_image = image
+        self.scale = scale
+        self.draws = draws
+        self.update_image()
+
+    def update_image(self):
+        self.fitted = None
+        if self.textured and self.shape is not None:
+            # the renderer turns upright_image as it draws, rect only needs the turned size
+            self.image = self.upright_image
+            self.rect = self.shape.mask(self.orientation).get_rect()
+        else:
+            angle = self.orientation * self.turn
+            image = pg.transform.rotate(self.upright_image, angle) if angle else self.upright_image
+            scale = self.scale
+            self.rect = pg.Rect(0, 0, round(image.get_width() / scale), round(image.get_height() / scale))
+            self.image = BLIT_FORMAT.finalize(image, self.draws)
+        self.rect.center = self.center
+        if self.shape is None:
+            self.collision = self.rect.copy()
+        else:
+            w, h = self.shape.mask(self.orientation).get_size()
+            bounds = self.shape.bounding_rect(self.orientation)
+            self.collision = bounds.move(self.center[0] - w // 2, self.center[1] - h // 2)
+
+class PuzzleSection(SectionModel):
     def grab(self, mouse_pos:tuple):
         for piece in self.pieces:
-            if piece.collision.collidepoint(mouse_pos):
+            if piece.collide(mouse_pos):
                 self.grabbed_piece = piece
-                for piece_ in self.pieces:
-                    piece_.grab_offset = piece_.rect.centerx - mouse_pos[0], piece_.rect.centery - mouse_pos[1]
-                self.grabbed = True
+                self.hold(mouse_pos)
                 return True
         return False
 
-    def set_pos(self, pos:tuple):
+    def draw(self, surface:pg.Surface, scale=1.0):
         for piece in self.pieces:
-            x, y = piece.grab_offset
-            piece.set_pos((pos[0] + x, pos[1] + y))
+            piece.draw(surface, scale)
 
-    def release(self):
-        self.grabbed = False
-        for piece in self.pieces:
-            piece.grab_offset = (0, 0)
+class HexPuzzlePiece(HexPieceModel, PuzzlePiece):
+    pass
 
-    def can_add(self, piece:PuzzlePiece):
-        return any((piece.is_joinable(s_piece) for s_piece in self.pieces))
-          
-    def can_add_section(self, section:Self):
-        for piece in section.pieces:
-            if self.can_add(piece):
-                return True
-        return False
-        
-    def add_piece(self, piece:PuzzlePiece, loose_pieces:dict[tuple[int,int],PuzzlePiece]):
-        for s_piece in self.pieces:
-            for side in piece.neighbors:
-                rotatedSide = piece.getRotatedSide(side)
-                if s_piece is piece.neighbors[side]:
-                    p1 = pg.Rect((0, 0), piece.size)
-                    p2 = p1.copy()
-                    p1.center = s_piece.rect.center
-                    if rotatedSide == "left":
-                        p2.left = p1.right
-                        p2.top = p1.top
-                    elif rotatedSide == "right":
-                        p2.right = p1.left
-                        p2.top = p1.top
-                    elif rotatedSide == "top":
-                        p2.top = p1.bottom
-                        p2.left = p1.left
-                    elif rotatedSide == "bottom":
-                        p2.bottom = p1.top
-                        p2.left = p1.left
-                    piece.set_pos(p2.center)
-                    self.pieces.append(piece)
-                    piece.grabbed = False
-                    index_ = piece.index
-                    del loose_pieces[index_]
-                    return                    
-        
-    def add_section(self, other_section:Self):
-        other_pieces = other_section.pieces
-        for other_piece in other_pieces:
-            for piece in self.pieces:
-                for side in piece.neighbors:
-                    rotatedSide = piece.getRotatedSide(side)
-                    if other_piece is piece.neighbors[side]:
-                        p1 = pg.Rect((0, 0), piece.size)
-                        p2 = p1.copy()
-                        p1.center = piece.rect.center
-                        p2.center = other_piece.rect.center
-                        if rotatedSide == "left":
-                            x_diff = p1.left - p2.right
-                            y_diff = p1.top - p2.top
-                        elif rotatedSide == "right":
-                            x_diff = p1.right - p2.left
-                            y_diff = p1.top - p2.top
-                        elif rotatedSide == "top":
-                            y_diff = p1.top - p2.bottom
-                            x_diff = p1.left - p2.left
-                        elif rotatedSide == "bottom":
-                            y_diff = p1.bottom - p2.top
-                            x_diff = p1.left - p2.left
-                        for piece_ in other_section.pieces:
-                            piece_.move_ip((x_diff, y_diff))
-                            self.pieces.append(piece_)
-                        self.grabbed = False
-                        return
-
-    def draw(self, surface:pg.Surface):
-        for piece in self.pieces:
-            piece.draw(surface)
-
-    def rotate(self, degrees=90):
-        assert degrees % 90 == 0
-        ndts = (degrees // 90) % 4
-        for piece in self.pieces:
-            piece.rotate(degrees)
-            piece.grab_offset = [(piece.grab_offset[0], piece.grab_offset[1]),
-                                 (piece.grab_offset[1], -piece.grab_offset[0]),
-                                 (-piece.grab_offset[0], -piece.grab_offset[1]),
-                                 (-piece.grab_offset[1], piece.grab_offset[0])][ndts]
-    
-class HexPuzzlePiece(PuzzlePiece):
-    def get_neighbors(self, piece_dict:dict[tuple[int,int],Self]):
-        self.neighbors = {}
-        parity = self.index[1] % 2
-        offsets = [((-1, 0), (1, 0), (0, -1), (1, -1), (0, 1), (1, 1)),
-                   ((-1, 0), (1, 0), (-1, -1), (0, -1), (-1, 1), (0, 1))][parity]
-        directions = ("left", "right", "topleft", "topright", "bottomleft", "bottomright")
-        sides = {offset: direct for offset, direct in zip(offsets, directions)}
-        for offset in offsets:
-            neighbor_index = self.index[0] + offset[0], self.index[1] + offset[1]
-            try:
-                neighbor = piece_dict[neighbor_index]
-            except KeyError:
-                neighbor = None
-            self.neighbors[sides[offset]] = neighbor
-
-    def is_joinable(self, other: Self):
-        if self.orientation != other.orientation:
-            return False
-        vSpacing = self.size[1] * 3 / 4
-        for side in self.neighbors:
-            rotatedSide = self.getRotatedSide(side)
-            if other is self.neighbors[side]:
-                r1 = pg.Rect((0,0), self.size)
-                r2 = r1.copy()
-                r1.center = self.rect.center
-                r2.center = other.rect.center
-                pos_pairs = {
-                        "left": ((r1.left, r2.right), (r1.top, r2.top)),
-                        "right": ((r1.right, r2.left), (r1.top, r2.top)),
-                        "topleft": ((r1.left, r2.centerx), (r1.top - r2.top, vSpacing)),
-                        "topright": ((r1.right, r2.centerx), (r1.top - r2.top, vSpacing)),
-                        "bottomleft": ((r1.left, r2.centerx), (r2.top - r1.top, vSpacing)),
-                        "bottomright": ((r1.right, r2.centerx), (r2.top - r1.top, vSpacing))}
-                if all((close_enough(*pair) for pair in pos_pairs[rotatedSide])):
-                    return True
-        return False
-    
-    def rotate(self, degrees=60):
-        assert degrees % 60 == 0
-        self.orientation = (self.orientation + degrees // 60) % 6
-        self.image = pg.transform.rotate(self.upright_image, self.orientation * 60)
-        self.collision = self.image.get_bounding_rect()
-        self.collision.move_ip(self.rect.topleft)
-    
-    def getRotatedSide(self, side: str):
-        sides = ["right","topright","topleft","left","bottomleft","bottomright"]
-        sideIndex = sides.index(side)
-        rotatedIndex = (sideIndex + self.orientation) % 6
-        return sides[rotatedIndex]
-    
-    def set_image(self, image: pg.Surface):
-        self.upright_image = image
-        self.image = pg.transform.rotate(image, self.orientation * 60)
-        self.collision = self.image.get_bounding_rect()
-        self.collision.move_ip(self.rect.topleft)
-
-class HexPuzzleSection(PuzzleSection):
-    def add_piece(self, piece, loose_pieces):
-        vSpacing = piece.size[1] * 3 / 4
-        for s_piece in self.pieces:
-            for side in piece.neighbors:
-                rotatedSide = piece.getRotatedSide(side)
-                if s_piece is piece.neighbors[side]:
-                    p1 = pg.Rect((0, 0), piece.size)
-                    p2 = p1.copy()
-                    p1.center = s_piece.rect.center
-                    if rotatedSide == "left":
-                        p2.left = p1.right
-                        p2.top = p1.top
-                    elif rotatedSide == "right":
-                        p2.right = p1.left
-                        p2.top = p1.top
-                    elif rotatedSide == "topleft":
-                        p2.centerx = p1.right
-                        p2.top = p1.top + vSpacing
-                    elif rotatedSide == "topright":
-                        p2.centerx = p1.left
-                        p2.top = p1.top + vSpacing
-                    elif rotatedSide == "bottomleft":
-                        p2.centerx = p1.right
-                        p2.top = p1.top - vSpacing
-                    elif rotatedSide == "bottomright":
-                        p2.centerx = p1.left
-                        p2.top = p1.top - vSpacing
-                    piece.set_pos(p2.center)
-                    self.pieces.append(piece)
-                    piece.grabbed = False
-                    index_ = piece.index
-                    del loose_pieces[index_]
-                    return
-    
-    def add_section(self, other_section: Self):
-        other_pieces = other_section.pieces
-        vSpacing = other_pieces[0].size[1] * 3 / 4
-        for other_piece in other_pieces:
-            for piece in self.pieces:
-                for side in piece.neighbors:
-                    rotatedSide = piece.getRotatedSide(side)
-                    if other_piece is piece.neighbors[side]:
-                        p1 = pg.Rect((0, 0), piece.size)
-                        p2 = p1.copy()
-                        p1.center = piece.rect.center
-                        p2.center = other_piece.rect.center
-                        if rotatedSide == "left":
-                            y_diff = p1.top - p2.top
-                            x_diff = p1.left - p2.right
-                        elif rotatedSide == "right":
-                            y_diff = p1.top - p2.top
-                            x_diff = p1.right - p2.left
-                        elif rotatedSide == "topleft":
-                            y_diff = p1.top - p2.top - vSpacing
-                            x_diff = p1.left - p2.centerx
-                        elif rotatedSide == "topright":
-                            y_diff = p1.top - p2.top - vSpacing
-                            x_diff = p1.right - p2.centerx
-                        elif rotatedSide == "bottomleft":
-                            y_diff = p1.top - p2.top + vSpacing
-                            x_diff = p1.left - p2.centerx
-                        elif rotatedSide == "bottomright":
-                            y_diff = p1.top - p2.top + vSpacing
-                            x_diff = p1.right - p2.centerx
-                        for piece_ in other_section.pieces:
-                            piece_.rect.move_ip(x_diff, y_diff)
-                            self.pieces.append(piece_)
-                        self.grabbed = False
-                        return
-    
-    def rotate(self, degrees=60):
-        assert degrees % 60 == 0
-        rad = -radians(degrees)
-        for piece in self.pieces:
-            piece.rotate(degrees)
-            x, y = piece.grab_offset
-            piece.grab_offset = (x * cos(rad) - y * sin(rad),
-                                 x * sin(rad) + y * cos(rad))
+class HexPuzzleSection(HexSectionModel, PuzzleSection):
+    pass
@@ -0,0 +1,96 @@
+"""
+Optional drawing through an SDL Renderer instead of software blits onto
+the display surface. Chosen at startup with --renderer:
+
+    surface   blits onto the display surface (default)
+    gpu       hardware accelerated Renderer, SDL's software renderer if
+              no accelerated driver can be created
+    software  SDL's software renderer, for testing without a GPU
+"""
+import weakref
+import pygame as pg
+from pygame._sdl2 import video
+
+BACKENDS = ("surface", "gpu", "software")
+
+
+def make_renderer(window:video.Window, backend:str):
+    if backend == "gpu":
+        try:
+            return video.Renderer(window, accelerated=1)
+        except video.error:
+            pass
+    return video.Renderer(window, accelerated=0)
+
+
+class TextureScreen(pg.Surface):
+    """
+    Stands in for the display surface when drawing through a Renderer in
+    its own window. It is a transparent overlay Surface, so states and
+    pygame_gui draw on it as usual, while draw_piece draws a piece as a
+    texture of its upright image with the rotation done by the renderer.
+    Piece textures are uploaded once per image. Overlay blits made before
+    a piece is drawn are flushed first to keep the draw order.
+    """
+    def __init__(self, size:tuple[int, int], title:str, backend="gpu"):
+        super(TextureScreen, self).__init__(size, pg.SRCALPHA)
+        self.window = video.Window(title, size=size)
+        self.renderer = make_renderer(self.window, backend)
+        self.renderer.logical_size = size
+        self.overlay = video.Texture(self.renderer, size, streaming=True)
+        self.overlay.blend_mode = pg.BLENDMODE_BLEND
+        self.textures:weakref.WeakKeyDictionary[pg.Surface, video.Texture] = weakref.WeakKeyDictionary()
+        self.dirty = False
+
+    def fill(self, color, rect=None, special_flags=0):
+        if rect is not None or special_flags:
+            self.dirty = True
+            return super(TextureScreen, self).fill(color, rect, special_flags)
+        self.renderer.draw_color = pg.Color(color)
+        self.renderer.clear()
+        self.dirty = False
+        return super(TextureScreen, self).fill((0, 0, 0, 0))
+
+    def blit(self, *args, **kwargs):
+        self.dirty = True
+        return super(TextureScreen, self).blit(*args, **kwargs)
+
+    def blits(self, *args, **kwargs):
+        self.dirty = True
+        return super(TextureScreen, self).blits(*args, **kwargs)
+
+    def fblits(self, *args, **kwargs):
+        self.dirty = True
+        return super(TextureScreen, self).fblits(*args, **kwargs)
+
+    def flush(self):
+        """Draw what was blitted on the overlay so far and clear it."""
+        if self.dirty:
+            self.overlay.update(self)
+            self.overlay.draw()
+            super(TextureScreen, self).fill((0, 0, 0, 0))
+            self.dirty = False
+
+    def texture(self, image:pg.Surface):
+        texture = self.textures.get(image)
+        if texture is None:
+            texture = self.textures[image] = video.Texture.from_surface(self.renderer, image)
+        return texture
+
+    def draw_piece(self, piece):
+        self.flush()
+        image = piece.upright_image
+        rect = pg.Rect(0, 0, round(image.get_width() / piece.scale), round(image.get_height() / piece.scale))
+        rect.center = piece.center
+        # the renderer turns clockwise, pg.transform.rotate counterclockwise
+        self.texture(image).draw(dstrect=rect, angle=-piece.orientation * piece.turn)
+
+    def present(self):
+        self.flush()
+        self.renderer.present()
+
+    def set_fullscreen(self, fullscreen:bool):
+        if fullscreen:
+            self.window.set_fullscreen(desktop=True)
+        else:
+            self.window.set_windowed()
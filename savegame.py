@@ -0,0 +1,101 @@
+import os
+import struct
+from puzzle_model import BoardModel
+
+MAGIC = b"PZS1"
+SHAPES = ("puzzle", "hexagon")
+NO_SECTION = 0xFFFF
+# magic, shape, horizontal hexes, length of the source reference, piece count
+HEADER = struct.Struct("<4sBHHI")
+# column, row, centerx, centery, orientation, section number
+RECORD = struct.Struct("<HHhhBH")
+
+
+def save(path:str, puzzle:BoardModel, mode:str, source:str):
+    """
+    Write the board to path: where the image came from (mode and source),
+    the shape and size, then one record per piece. Loose pieces come first
+    in draw order, followed by the pieces of each section.
+    """
+    shape = SHAPES.index(puzzle.shape)
+    hexes = getattr(puzzle, "horizontalHexes", 0)
+    reference = f"{mode}:{source}".encode()
+    pieces = len(puzzle.pieces) + sum(len(section.pieces) for section in puzzle.sections)
+    data = bytearray(HEADER.pack(MAGIC, shape, hexes, len(reference), pieces) + reference)
+    for piece in puzzle.pieces.values():
+        data += RECORD.pack(*piece.index, *piece.center, piece.orientation, NO_SECTION)
+    for number, section in enumerate(puzzle.sections):
+        for piece in section.pieces:
+            data += RECORD.pack(*piece.index, *piece.center, piece.orientation, number)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def save_board(path:str, persistent:dict):
+    """
+    Save the unfinished board of a game's persistent dict so it can be
+    resumed, remove the save once it is finished. Camera boards can't be
+    resumed and are not saved.
+    """
+    if "puzzle" not in persistent or persistent["mode"] == "camera":
+        return
+    puzzle:BoardModel = persistent["puzzle"]
+    if puzzle.is_complete():
+        discard(path)
+        return
+    save(path, puzzle, persistent["mode"], persistent["source"])
+
+
+def discard(path:str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def read(path:str):
+    """
+    Returns a dict with the mode, source, shape and hexes needed to rebuild
+    the puzzle, plus the piece records to hand to restore.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, shape, hexes, reference_len, count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a saved puzzle")
+    offset = HEADER.size
+    mode, source = data[offset:offset + reference_len].decode().split(":", 1)
+    offset += reference_len
+    records = list(RECORD.iter_unpack(data[offset:offset + count * RECORD.size]))
+    return {"mode": mode, "source": source, "shape": SHAPES[shape],
+            "hexes": hexes, "pieces": records}
+
+
+def restore(puzzle:BoardModel, records:list[tuple]):
+    """
+    Put the pieces of a freshly built, unspread puzzle back where the
+    records say, regrouping them into their sections. Raises ValueError
+    unless the records cover every piece exactly once.
+    """
+    pieces = dict(puzzle.pieces)
+    if len(records) != len(pieces) or len({record[:2] for record in records}) != len(pieces):
+        raise ValueError(f"save has {len(records)} pieces for a board of {len(pieces)}")
+    loose = {}
+    sections:dict[int, list] = {}
+    for column, row, x, y, orientation, number in records:
+        piece = pieces[(column, row)]
+        if orientation:
+            piece.rotate(orientation * piece.turn)
+        piece.set_pos((x, y))
+        if number == NO_SECTION:
+            loose[piece.index] = piece
+        else:
+            sections.setdefault(number, []).append(piece)
+    puzzle.pieces.clear()
+    puzzle.pieces.update(loose)
+    puzzle.sections[:] = [puzzle.section_type(tuple(section)) for section in sections.values()]
@@ -0,0 +1,189 @@
+import asyncio
+import netcode
+from puzzle_model import BoardModel, PieceModel, SectionModel, make_board
+
+
+class Client(object):
+    def __init__(self, writer:asyncio.StreamWriter):
+        self.writer = writer
+        self.held:PieceModel|SectionModel|None = None
+        self.pos:tuple[int,int] = (0, 0)
+        self.ping = 0
+        self.needs_snapshot = True
+
+
+class BoardServer(object):
+    """
+    Authoritative owner of one headless board shared by several clients.
+    Client actions are applied as they arrive; once per tick every client
+    gets the pieces whose position, orientation or section changed.
+    """
+    def __init__(self, puzzle:BoardModel, tick_rate=30, max_backlog=256 * 1024):
+        self.puzzle = puzzle
+        self.tick_rate = tick_rate
+        self.max_backlog = max_backlog
+        self.clients:list[Client] = []
+        self.tick = 0
+        self.sent:dict[tuple[int,int], tuple] = {}
+        self.section_ids:dict[int, int] = {}
+        self.next_section_id = 0
+        self.bytes_sent = 0
+
+    def all_pieces(self):
+        for piece in self.puzzle.pieces.values():
+            yield piece, None
+        for section in self.puzzle.sections:
+            for piece in section.pieces:
+                yield piece, section
+
+    def find(self, index:tuple[int,int]):
+        """Returns (piece, section or None) for a piece index."""
+        piece = self.puzzle.pieces.get(index)
+        if piece is not None:
+            return piece, None
+        for section in self.puzzle.sections:
+            for piece in section.pieces:
+                if piece.index == index:
+                    return piece, section
+        return None, None
+
+    def is_held(self, item):
+        return any(client.held is item for client in self.clients)
+
+    def release_stale(self):
+        """Drop holds on pieces and sections that were absorbed by a join."""
+        loose = set(map(id, self.puzzle.pieces.values()))
+        sections = set(map(id, self.puzzle.sections))
+        for client in self.clients:
+            if client.held is None:
+                continue
+            if isinstance(client.held, SectionModel):
+                alive = id(client.held) in sections
+            else:
+                alive = id(client.held) in loose
+            if not alive:
+                client.held = None
+
+    def handle(self, client:Client, action:int, index:tuple[int,int], pos:tuple[int,int]):
+        if action == netcode.PING:
+            client.ping = index[0]
+        elif action == netcode.GRAB:
+            if client.held is not None:
+                return
+            piece, section = self.find(index)
+            item = section if section is not None else piece
+            if item is None or self.is_held(item):
+                return
+            client.pos = piece.center
+            if section is not None:
+                section.hold(client.pos)
+            client.held = item
+        elif client.held is None:
+            return
+        elif action == netcode.MOVE:
+            client.pos = pos
+            client.held.set_pos(pos)
+        elif action == netcode.ROTATE:
+            client.held.rotate()
+            client.held.set_pos(client.pos)
+        elif action == netcode.DROP:
+            if isinstance(client.held, SectionModel):
+                self.puzzle.drop_section(client.held)
+            else:
+                self.puzzle.drop_piece(client.held)
+            client.held = None
+            self.release_stale()
+
+    def section_id(self, section:SectionModel|None):
+        if section is None:
+            return netcode.NO_SECTION
+        key = id(section)
+        if key not in self.section_ids:
+            self.section_ids[key] = self.next_section_id
+            self.next_section_id = (self.next_section_id + 1) % netcode.NO_SECTION
+        return self.section_ids[key]
+
+    def collect(self):
+        """Returns (every piece state, states changed since the last tick)."""
+        live = set(map(id, self.puzzle.sections))
+        for key in [key for key in self.section_ids if key not in live]:
+            del self.section_ids[key]
+        states = []
+        changed = []
+        for piece, section in self.all_pieces():
+            x, y = piece.center
+            state = (piece.index[0], piece.index[1], x, y,
+                     piece.orientation, self.section_id(section))
+            states.append(state)
+            if self.sent.get(piece.index) != state:
+                self.sent[piece.index] = state
+                changed.append(state)
+        return states, changed
+
+    def broadcast(self):
+        states, changed = self.collect()
+        delta = netcode.encode_pieces(changed)
+        snapshot = None
+        for client in self.clients:
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > self.max_backlog:
+                client.needs_snapshot = True
+                continue
+            if client.needs_snapshot:
+                if snapshot is None:
+                    snapshot = netcode.encode_pieces(states)
+                frame = netcode.encode_frame(self.tick, client.ping, len(states), snapshot)
+                client.needs_snapshot = False
+            else:
+                frame = netcode.encode_frame(self.tick, client.ping, len(changed), delta)
+            client.writer.write(frame)
+            self.bytes_sent += len(frame)
+        self.tick += 1
+
+    async def serve_client(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter):
+        client = Client(writer)
+        self.clients.append(client)
+        size = netcode.ACTION.size
+        try:
+            while True:
+                data = await reader.readexactly(size)
+                self.handle(client, *netcode.decode_action(data))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.clients.remove(client)
+            writer.close()
+
+    async def run(self, host="127.0.0.1", port=5566):
+        server = await asyncio.start_server(self.serve_client, host, port)
+        loop = asyncio.get_running_loop()
+        period = 1 / self.tick_rate
+        next_tick = loop.time()
+        async with server:
+            while True:
+                self.broadcast()
+                next_tick += period
+                await asyncio.sleep(max(0, next_tick - loop.time()))
+
+
+def make_puzzle(image_size=(800, 600), shape="puzzle", hexes=8):
+    board = make_board(shape, image_size, hexes)
+    board.spread_pieces((1500, 900))
+    return board
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Shared-board puzzle server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5566)
+    parser.add_argument("--width", type=int, default=800, help="source image width")
+    parser.add_argument("--height", type=int, default=600, help="source image height")
+    parser.add_argument("--shape", choices=("puzzle", "hexagon"), default="puzzle")
+    parser.add_argument("--hexes", type=int, default=8)
+    parser.add_argument("--tick-rate", type=int, default=30)
+    args = parser.parse_args()
+    board = BoardServer(make_puzzle((args.width, args.height), args.shape, args.hexes), args.tick_rate)
+    asyncio.run(board.run(args.host, args.port))
@@ -0,0 +1,129 @@
+from random import shuffle
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+from puzzle_model import BoardModel, PieceModel, SectionModel, make_board
+
+
+class Solver(object):
+    """
+    Assembles a scrambled board by issuing the same join calls the dragging
+    states use: join_pieces, add_piece and add_section. Works on a Puzzle
+    or HexPuzzle as well as on a headless BoardModel. Every join is timed.
+    """
+    def __init__(self, puzzle:BoardModel):
+        self.puzzle = puzzle
+        self.timings:dict[str, list[float]] = {"join_pieces": [],
+                                               "add_piece": [],
+                                               "add_section": []}
+        self.owner:dict[tuple[int,int], SectionModel] = {}
+
+    def is_complete(self):
+        return self.puzzle.is_complete()
+
+    def straighten(self, piece:PieceModel):
+        """Rotate a loose piece back to orientation 0."""
+        turns = -piece.orientation % (360 // piece.turn)
+        if turns:
+            piece.rotate(turns * piece.turn)
+
+    def timed(self, name:str, func, *args):
+        start = perf_counter()
+        func(*args)
+        self.timings[name].append(perf_counter() - start)
+
+    def neighbor_sections(self, piece:PieceModel):
+        sections = []
+        for neighbor in piece.neighbors.values():
+            if neighbor is None:
+                continue
+            section = self.owner.get(neighbor.index)
+            if section is not None and section not in sections:
+                sections.append(section)
+        return sections
+
+    def place(self, piece:PieceModel):
+        """Join a single loose piece to whatever it borders."""
+        sections = self.neighbor_sections(piece)
+        if sections:
+            section = sections[0]
+            self.timed("add_piece", section.add_piece, piece, self.puzzle.pieces)
+            self.owner[piece.index] = section
+            for other in sections[1:]:
+                self.timed("add_section", section.add_section, other)
+                self.puzzle.sections.remove(other)
+                for other_piece in other.pieces:
+                    self.owner[other_piece.index] = section
+            return
+        for neighbor in piece.neighbors.values():
+            if neighbor is not None and neighbor.index in self.puzzle.pieces:
+                self.timed("join_pieces", self.puzzle.join_pieces, neighbor, piece)
+                section = self.puzzle.sections[-1]
+                self.owner[neighbor.index] = section
+                self.owner[piece.index] = section
+                return
+
+    def solve(self, shuffled=True):
+        """
+        Straighten every loose piece and join them one at a time until the
+        board is complete. Pieces are visited in random order (unless
+        shuffled is False) so separate sections grow and get merged.
+        Returns the number of joins issued.
+        """
+        for section in self.puzzle.sections:
+            for piece in section.pieces:
+                self.owner[piece.index] = section
+        pieces = list(self.puzzle.pieces.values())
+        for piece in pieces:
+            self.straighten(piece)
+        if shuffled:
+            shuffle(pieces)
+        for piece in pieces:
+            if piece.index in self.owner:
+                continue
+            self.place(piece)
+        return sum(len(times) for times in self.timings.values())
+
+    def report(self):
+        """Count, total and mean seconds per join call."""
+        result = {}
+        for name, times in self.timings.items():
+            total = sum(times)
+            result[name] = {"count": len(times),
+                            "total": total,
+                            "mean": total / len(times) if times else 0.0}
+        return result
+
+
+def solve_board(shape:str, image_size:tuple[int,int], horizontalHexes=8):
+    """
+    Build, scramble and solve one headless board. Returns (piece count,
+    joins, mean seconds per join, total seconds).
+    """
+    board = make_board(shape, image_size, horizontalHexes)
+    board.spread_pieces((1500, 900))
+    piece_count = len(board.pieces)
+    solver = Solver(board)
+    start = perf_counter()
+    joins = solver.solve()
+    total = perf_counter() - start
+    assert solver.is_complete(), f"{shape} board was not assembled"
+    return piece_count, joins, total / max(joins, 1), total
+
+
+def scaling_report(image_size=(800, 600), hex_sizes=(4, 8, 16, 32, 64), processes=None):
+    """
+    Solve a puzzle board and hexagon boards of growing size, one per worker
+    process, and return one row per board: (name, piece count, joins, mean
+    seconds per join, total seconds).
+    """
+    boards = [("puzzle", "puzzle", 8)] + [(f"hexagon-{size}", "hexagon", size) for size in hex_sizes]
+    with ProcessPoolExecutor(processes) as pool:
+        results = pool.map(solve_board, [shape for _, shape, _ in boards],
+                           [image_size] * len(boards), [size for _, _, size in boards])
+        return [(name, *result) for (name, _, _), result in zip(boards, results)]
+
+
+if __name__ == "__main__":
+    print(f"{'board':>12} {'pieces':>7} {'joins':>6} {'us/join':>9} {'total ms':>9}")
+    for name, pieces, joins, mean, total in scaling_report():
+        print(f"{name:>12} {pieces:>7} {joins:>6} {mean * 1e6:>9.1f} {total * 1e3:>9.1f}")
@@ -1,5 +1,46 @@
+from time import perf_counter
+from typing import Iterator
 import pygame as pg
 import prepare
+import savegame
+from blit_format import BLIT_FORMAT
+from render import TextureScreen
+from puzzle import Puzzle
+from puzzle_piece import PuzzlePiece
+
+
+class Scheduler(object):
+    """
+    Cooperative scheduler for work too slow to do within one frame.
+    Tasks are generators that yield after every small step, run resumes
+    them in turn until the frame's budget is spent. A task is added for
+    an owner and replaces that owner's unfinished one, so e.g. only the
+    newest camera frame keeps being sliced.
+    """
+    def __init__(self):
+        self.tasks:dict[object, Iterator] = {}
+
+    def add(self, owner, task:Iterator):
+        self.tasks[owner] = task
+
+    def cancel(self, owner):
+        self.tasks.pop(owner, None)
+
+    def run(self, budget:float):
+        """Step tasks for about budget milliseconds, returns the number of steps taken."""
+        deadline = perf_counter() + budget / 1000
+        steps = 0
+        while self.tasks and perf_counter() < deadline:
+            for owner, task in list(self.tasks.items()):
+                try:
+                    next(task)
+                except StopIteration:
+                    del self.tasks[owner]
+                steps += 1
+                if perf_counter() >= deadline:
+                    break
+        return steps
+
             
 class GameState(object):
     """
@@ -12,6 +53,11 @@ class GameState(object):
         self.screen_rect = pg.display.get_surface().get_rect()
         self.persist = {}
         self.font = pg.font.Font(None, 24)
+        self.redraw = True
+        self.ui_elements:list = []
+        self.ui_manager = None
+        # the Game's, set when it takes the state
+        self.scheduler:Scheduler
         
     def startup(self, persistent:dict):
         """
@@ -21,12 +67,77 @@ class GameState(object):
         persistent: a dict passed from state to state
         """
         self.persist = persistent        
+
+    def cleanup(self):
+        """
+        Called when the Game switches away from this state,
+        before the next state's startup.
+        """
+        pass
+
+    def setup_ui(self, manager) -> list:
+        """
+        Create this state's persistent UI elements on manager and return
+        them. Called through ensure_ui, so only once unless the elements
+        get killed, e.g. by manager.clear_and_reset.
+        """
+        return []
+
+    def ensure_ui(self, manager):
+        """
+        Rebuild the persistent UI only if it is missing, so startup only
+        has to show or hide it.
+        """
+        if manager is not self.ui_manager or not all(e.alive() for e in self.ui_elements):
+            self.ui_manager = manager
+            self.ui_elements = self.setup_ui(manager)
         
     def get_event(self, event:pg.Event):
         """
         Handle a single event passed by the Game object.
         """
         pass
+
+    def shutdown(self):
+        """
+        Called once when the game quits, whatever the state. Saves an
+        unfinished board so it can be resumed on the next start.
+        """
+        savegame.save_board(prepare.SAVE_PATH, self.persist)
+
+    def display_changed(self):
+        """
+        Called after the display mode changed, so display-format
+        surfaces can be converted again.
+        """
+        pass
+
+    def finalize_puzzle(self, puzzle:Puzzle):
+        """
+        For display_changed: redo the display dependent stages of the piece
+        images, or after a render scale change have the scheduler slice them
+        again, replacing any slicing under way at the old scale.
+        """
+        if puzzle.image_scale != puzzle.render_scale:
+            self.schedule_image(puzzle, puzzle.source_image)
+        else:
+            puzzle.finalize_images()
+
+    def schedule_image(self, puzzle:Puzzle, image:pg.Surface, first=()):
+        """
+        Have the Game's scheduler slice image into puzzle a few pieces per
+        frame, the pieces in first before any others.
+        """
+        self.scheduler.add(puzzle, puzzle.image_steps(image, first))
+
+    def next_frame(self) -> int|None:
+        """
+        Milliseconds the Game may wait for input before this state needs
+        another update. 0 asks for the full frame rate, None means nothing
+        is due until the next event. Set self.redraw when an update
+        changed what is on screen without any input.
+        """
+        return None
     
     def update(self, dt:int):
         """
@@ -42,6 +153,13 @@ class GameState(object):
         Draw everything to the screen.
         """
         pass
+
+    def draw_ui(self, surface:pg.Surface):
+        """
+        Draw the UI over what draw drew. This surface is always the
+        display, while draw may get a smaller canvas, see Game.set_render_scale.
+        """
+        pass
     
 class Game(object):
     """
@@ -62,27 +180,97 @@ class Game(object):
         """
         self.done = False
         self.screen = screen
+        PuzzlePiece.textured = isinstance(screen, TextureScreen)
         self.clock = pg.time.Clock()
         self.fps = 60
+        self.max_wait = 250
+        self.input_grace = 250
+        self.last_input = 0
         self.states:dict[str, GameState] = states
+        self.scheduler = Scheduler()
+        # milliseconds per frame the scheduler may use
+        self.task_budget = 4
+        for state in states.values():
+            state.scheduler = self.scheduler
         self.state_name = start_state
         self.state = self.states[self.state_name]
         self.fullscreen = False
+        self.memory = None
+        # R cycles through these
+        self.render_scales = (1.0, 0.75, 0.5)
+        self.render_scale = 1.0
+        self.canvas:pg.Surface|None = None
+
+    def make_canvas(self):
+        if self.render_scale == 1 or isinstance(self.screen, TextureScreen):
+            self.canvas = None
+        else:
+            w, h = self.screen.get_size()
+            size = round(w * self.render_scale), round(h * self.render_scale)
+            self.canvas = pg.Surface(size).convert(self.screen)
+
+    def set_render_scale(self, scale:float):
+        """
+        Build and draw the board and pieces at scale times the resolution
+        of the window, scaled up to it once per frame. The UI stays at full
+        resolution. Board coordinates don't change with it, so input and
+        game logic need no mapping, only piece images and drawing scale.
+        """
+        self.render_scale = scale
+        Puzzle.render_scale = scale
+        self.make_canvas()
+        self.state.display_changed()
+        self.state.redraw = True
+
+    def cycle_render_scale(self):
+        scales = self.render_scales
+        current = scales.index(self.render_scale) if self.render_scale in scales else -1
+        self.set_render_scale(scales[(current + 1) % len(scales)])
         
     def toggle_fullscreen(self):
         self.fullscreen = not self.fullscreen
-        if self.fullscreen:
+        if isinstance(self.screen, TextureScreen):
+            self.screen.set_fullscreen(self.fullscreen)
+        elif self.fullscreen:
             self.screen = pg.display.set_mode(prepare.SCREEN_SIZE, pg.FULLSCREEN)
         else:            
             self.screen = pg.display.set_mode(prepare.SCREEN_SIZE)        
+        self.make_canvas()
+        BLIT_FORMAT.reset()
+        self.state.display_changed()
+        self.state.redraw = True
     
-    def event_loop(self):
+    def full_rate(self):
+        """Whether the active state is moving, work is scheduled or input arrived very recently."""
+        if self.state.next_frame() == 0 or self.scheduler.tasks:
+            return True
+        return pg.time.get_ticks() - self.last_input < self.input_grace
+
+    def wait_events(self):
+        """
+        Block until an event arrives, the active state's next frame is due
+        or max_wait passes, then return all pending events.
+        """
+        timeout = self.state.next_frame()
+        if timeout is None or timeout > self.max_wait:
+            timeout = self.max_wait
+        event = pg.event.wait(timeout)
+        if event.type == pg.NOEVENT:
+            return []
+        return [event] + pg.event.get()
+
+    def event_loop(self, events:list[pg.Event]):
         """Events are passed for handling to the current state."""
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
+        if events:
+            self.last_input = pg.time.get_ticks()
+        for event in events:
+            # a TextureScreen's window is not the last one, so closing it sends no QUIT
+            if event.type in (pg.QUIT, pg.WINDOWCLOSE):
                 self.done = True
             elif event.type == pg.KEYDOWN and event.key == pg.K_f:
                 self.toggle_fullscreen()
+            elif event.type == pg.KEYDOWN and event.key == pg.K_r:
+                self.cycle_render_scale()
             self.state.get_event(event)
             
     def flip_state(self):
@@ -91,8 +279,10 @@ class Game(object):
         self.state.done = False
         self.state_name = next_state
         persistent = self.state.persist
+        self.state.cleanup()
         self.state = self.states[self.state_name]
         self.state.startup(persistent)
+        self.state.redraw = True
         
     def update(self, dt:int):
         """
@@ -103,21 +293,48 @@ class Game(object):
         if self.state.quit:
             self.done = True
         elif self.state.done:
-            self.flip_state()    
+            self.flip_state()
+            if self.memory is not None:
+                self.memory.sample(self.state_name, self.state.persist)    
         self.state.update(dt)
+        if self.scheduler.tasks and self.scheduler.run(self.task_budget):
+            self.state.redraw = True
         
     def draw(self):
-        """Pass display surface to active state for drawing."""
-        self.state.draw(self.screen)
+        """
+        Pass display surface, or the canvas below full render scale,
+        to active state for drawing.
+        """
+        if self.canvas is None:
+            self.state.draw(self.screen)
+        else:
+            self.state.draw(self.canvas)
+            pg.transform.scale(self.canvas, self.screen.get_size(), self.screen)
+        self.state.draw_ui(self.screen)
+
+    def present(self):
+        if isinstance(self.screen, TextureScreen):
+            self.screen.present()
+        else:
+            pg.display.update()
         
     def run(self):
         """
         Pretty much the entirety of the game's runtime will be
-        spent inside this while loop.
+        spent inside this while loop. While nothing moves it sleeps
+        in wait_events and only redraws when something changed.
         """ 
         while not self.done:
-            dt = self.clock.tick(self.fps)
-            self.event_loop()
+            if self.full_rate():
+                dt = self.clock.tick(self.fps)
+                events = pg.event.get()
+            else:
+                events = self.wait_events()
+                dt = self.clock.tick()
+            self.event_loop(events)
             self.update(dt)
-            self.draw()
-            pg.display.update()
+            if events or self.state.redraw or self.full_rate():
+                self.state.redraw = False
+                self.draw()
+                self.present()
+        self.state.shutdown()
@@ -1,30 +1,180 @@
 import os
 import copy
+import json
+import mmap
+import tempfile
+from bisect import bisect_right
+from itertools import accumulate
 import pygame as pg
-from PIL import ImageSequence
-from puzzle import Puzzle
+from puzzle import KEY_INDEX
+# PIL is imported where it is used, it is only needed for files and animations
+
+class FrameStore:
+    """
+    Decoded frames kept in a memory-mapped temporary file instead of one
+    Surface each, RGBA or 8-bit with their palette. Indexing returns a
+    Surface viewing the mapped bytes, so resident memory is left to the
+    OS page cache.
+    """
+    def __init__(self, size:tuple[int,int]) -> None:
+        self.size = size
+        self.nbytes = 0
+        # offset, mode and palette of every frame
+        self.index:list[tuple[int, str, list|None]] = []
+        self.file = tempfile.TemporaryFile()
+        self.map:mmap.mmap
+
+    def append(self, data:bytes, mode="RGBA", palette:list|None=None):
+        self.file.write(data)
+        self.index.append((self.nbytes, mode, palette))
+        self.nbytes += len(data)
+
+    def finish(self):
+        self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def __len__(self): return len(self.index)
+
+    def __getitem__(self, index:int):
+        start, mode, palette = self.index[index]
+        length = self.size[0] * self.size[1] * (1 if mode == "P" else 4)
+        view = memoryview(self.map)[start:start + length]
+        frame = pg.image.frombuffer(view, self.size, mode)
+        if palette is not None:
+            frame.set_palette(palette)
+        return frame
+
+def indexed_frame(frame):
+    """
+    Returns (pixels, palette) of frame, a PIL image, as 8-bit with an exact palette of
+    its colors, leaving KEY_INDEX free for Puzzle's colorkey, or None if
+    the frame has too many colors for that and needs full color.
+    """
+    from PIL import Image
+    rgb = frame.convert("RGB")
+    colors = rgb.getcolors(KEY_INDEX)
+    if colors is None:
+        return None
+    palette = [color for _, color in colors]
+    palette_image = Image.new("P", (1, 1))
+    palette_image.putpalette([channel for color in palette for channel in color])
+    indexed = rgb.quantize(palette=palette_image, dither=Image.Dither.NONE)
+    pixels = indexed.tobytes()
+    if bytes([KEY_INDEX]) in pixels:
+        return None
+    return pixels, palette
+
+def indexed_surface(pixels:bytes, size:tuple[int, int], palette:list):
+    surface = pg.image.frombytes(pixels, size, "P")
+    surface.set_palette(palette)
+    return surface
 
 class Animated:
-    def __init__(self, image) -> None:
-        self.frames = []
+    """
+    Frames of an animated image. GIF frames (and any other frame with at
+    most 255 colors) stay 8-bit with their own palette, others are kept
+    in full color.
+    """
+    # decoded size above which frames go to a FrameStore when mapped is None
+    MAPPED_BYTES = 64 * 1024 * 1024
+    # milliseconds, GIFs with a zero delay still get a place on the timeline
+    MIN_DURATION = 10
+
+    def __init__(self, image, mapped:bool|None=None) -> None:
+        from PIL import ImageSequence
+        self.frames:list[pg.Surface]|FrameStore = []
         self.durations = []
+        self.indexed = 0
+        if mapped is None:
+            mapped = image.width * image.height * 4 * getattr(image, "n_frames", 1) > self.MAPPED_BYTES
+        if mapped:
+            self.frames = FrameStore(image.size)
         for frame in ImageSequence.Iterator(image):
-            frame.save(f"./resources/temp/frame.png")
-            pgFrame = pg.image.load(f"./resources/temp/frame.png")
-            self.frames.append(pgFrame)
+            indexed = indexed_frame(frame)
+            if indexed is not None:
+                self.indexed += 1
+                pixels, palette = indexed
+                if mapped:
+                    self.frames.append(pixels, "P", palette)
+                else:
+                    self.frames.append(indexed_surface(pixels, image.size, palette))
+            elif mapped:
+                self.frames.append(frame.convert("RGBA").tobytes())
+            else:
+                frame.save(f"./resources/temp/frame.png")
+                pgFrame = pg.image.load(f"./resources/temp/frame.png")
+                self.frames.append(pgFrame)
             self.durations.append(frame.info["duration"])
+        if mapped:
+            self.frames.finish()
+        # frame durations as a timeline: the time each frame ends within a loop
+        self.ends = list(accumulate(max(duration, self.MIN_DURATION) for duration in self.durations))
+        self.loop = self.ends[-1]
+        self.elapsed = 0
+        # frames since the start counting repeats, and how many of them were skipped
+        self.shown = 0
+        self.dropped = 0
         self.index = 0
-        self.duration = 0
 
     def first_frame(self): return self.frames[0]
 
-    def update(self, puzzle:Puzzle, dt:int):
-        self.duration += dt
-        if self.duration < self.durations[self.index]:
-            return
-        self.index = (self.index + 1) % len(self.frames)
-        puzzle.set_image(self.frames[self.index])
-        self.duration = 0
+    def frame_number(self, elapsed:int):
+        """Frames started after elapsed milliseconds, counting repeats of the loop."""
+        loops, position = divmod(elapsed, self.loop)
+        return loops * len(self.ends) + bisect_right(self.ends, position)
+
+    def time_to_next(self):
+        """Milliseconds until update should show the next frame."""
+        position = self.elapsed % self.loop
+        return self.ends[bisect_right(self.ends, position)] - position
+
+    def update(self, dt:int):
+        """
+        Advances the timeline by dt and returns the frame due at that time
+        if it changed, None otherwise. When dt passes over whole frames,
+        as it does under load, those are counted in dropped and never
+        fetched, so they are neither turned into a Surface nor sliced.
+        """
+        self.elapsed += dt
+        shown = self.frame_number(self.elapsed)
+        if shown == self.shown:
+            return None
+        self.dropped += shown - self.shown - 1
+        self.shown = shown
+        self.index = shown % len(self.ends)
+        return self.frames[self.index]
+
+def load_scaled(path:str, size=800):
+    """
+    Load an image file for puzzling with its longest side no smaller than
+    size but without decoding much more than that. JPEGs are decoded at a
+    reduced DCT scale via draft, other formats are box-reduced by a whole
+    factor right after decoding. Puzzle.set_image does the final scaling.
+    Palettized sources such as GIFs stay 8-bit if they have a color to
+    spare, reduced with nearest neighbour so the indices survive.
+    """
+    from PIL import Image
+    with Image.open(path) as img:
+        scalar = size / max(img.size)
+        if img.mode == "P":
+            factor = max(img.size) // size
+            if factor > 1:
+                # nearest neighbour keeps the palette indices
+                img = img.resize((img.width // factor, img.height // factor), Image.Resampling.NEAREST)
+            indexed = indexed_frame(img)
+            if indexed is not None:
+                pixels, palette = indexed
+                return indexed_surface(pixels, img.size, palette)
+        if scalar < 1:
+            img.draft("RGB", (int(img.width * scalar) + 1, int(img.height * scalar) + 1))
+            factor = max(img.size) // size
+            if factor > 1:
+                if img.mode not in ("RGB", "RGBA", "L", "LA", "CMYK"):
+                    # e.g. bilevel or 16-bit grayscale, which reduce can't do
+                    img = img.convert("RGB")
+                img = img.reduce(factor)
+        img = img.convert("RGB")
+        return pg.image.frombytes(img.tobytes(), img.size, "RGB")
 
 class _KwargMixin(object):
     """
@@ -51,11 +201,11 @@ class _KwargMixin(object):
             setattr(self, setting, settings[setting])
 
 
-def load_all_gfx(directory,colorkey=(0,0,0),accept=(".png",".jpg",".bmp")):
+def load_all_gfx(directory,colorkey=(0,0,0),accept=(".png",".jpg",".bmp"),skip=()):
     graphics = {}
     for pic in os.listdir(directory):
         name,ext = os.path.splitext(pic)
-        if ext.lower() in accept:
+        if ext.lower() in accept and name not in skip:
             img = pg.image.load(os.path.join(directory, pic))
             if img.get_alpha():
                 img = img.convert_alpha()
@@ -66,6 +216,28 @@ def load_all_gfx(directory,colorkey=(0,0,0),accept=(".png",".jpg",".bmp")):
     return graphics
 
 
+def load_sheet(path):
+    """
+    Loads a sheet written by mask_sheet.py (path without extension) in a
+    single read, returning its images by name as subsurfaces. Returns an
+    empty dict if the sheet was never built.
+    """
+    if not os.path.exists(path + ".json"):
+        return {}
+    with open(path + ".json") as f:
+        index = json.load(f)
+    sheet = pg.image.load(path + ".png").convert_alpha()
+    graphics = {}
+    for grid in index["grids"]:
+        frames = strip_from_sheet(sheet, grid["start"], grid["size"], grid["columns"], grid["rows"])
+        for number, frame in enumerate(frames):
+            row, column = divmod(number, grid["columns"])
+            graphics[f"{grid['prefix']}{column}-{row}"] = frame
+    for name, rect in index["images"].items():
+        graphics[name] = sheet.subsurface(rect)
+    return graphics
+
+
 def load_all_music(directory, accept=(".wav", ".mp3", ".ogg", ".mdi")):
     songs = {}
     for song in os.listdir(directory):